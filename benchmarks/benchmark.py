@@ -0,0 +1,130 @@
+from loguru import logger
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from src.stix_parser import StixParser
+from src.markdown_generator import MarkdownGenerator
+from src.markdown_reader import MarkdownReader
+from src.note_watcher import NoteLinker
+from .synthetic_bundle import write_bundle
+
+
+class Stopwatch():
+    """
+    Collect the wall time of the benchmark stages, keeping the best of the repeated runs
+    """
+
+    def __init__(self):
+        self.timings = dict()
+
+    def run(self, stage, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.timings[stage] = min(elapsed, self.timings.get(stage, elapsed))
+        return result
+
+
+def write_large_note(path, techniques, size):
+    """
+    Write a report note citing size technique IDs
+    """
+
+    with open(path, 'w') as fd:
+        for i in range(size):
+            technique = techniques[i % len(techniques)]
+            fd.write(f"Paragraph {i}: the actor used {technique.id} to move on.\n")
+
+
+def benchmark_scale(scale, work_dir, repeat=1, workers=1, note_size=5000):
+    """
+    Time each stage of a vault build on a synthetic bundle of the given scale
+    """
+
+    bundle_path = os.path.join(work_dir, f"bundle-{scale}.json")
+    bundle = write_bundle(bundle_path, scale)
+    stopwatch = Stopwatch()
+
+    for _ in range(repeat):
+        output_dir = os.path.join(work_dir, f"vault-{scale}")
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.mkdir(output_dir)
+
+        parser = stopwatch.run('load', StixParser, bundle_path, 'enterprise-attack')
+        stopwatch.run('get_data', parser.get_data, tactics=True, techniques=True, mitigations=True, groups=True, software=True,
+                      campaigns=True, datasources=True)
+
+        markdown_generator = MarkdownGenerator(output_dir, parser.tactics, parser.techniques, parser.mitigations,
+                                               parser.groups, parser.software, parser.campaigns, parser.datasources, workers=workers)
+        for note_type in ('tactic', 'technique', 'mitigation', 'group', 'software', 'campaign', 'datasource'):
+            stopwatch.run(f"create_{note_type}_notes", getattr(markdown_generator, f"create_{note_type}_notes"))
+        stopwatch.run('finalize', markdown_generator.finalize)
+        stopwatch.run('create_canvas', markdown_generator.create_canvas, os.path.join(output_dir, 'matrix'))
+
+        note_path = os.path.join(work_dir, f"note-{scale}.md")
+        write_large_note(note_path, parser.techniques, note_size)
+        markdown_reader = MarkdownReader(note_path)
+        linker = NoteLinker(parser.techniques + parser.groups + parser.software)
+        stopwatch.run('create_hyperlinks', markdown_reader.create_hyperlinks, linker)
+
+    return {
+        'scale': scale,
+        'objects': len(bundle['objects']),
+        'relationships': sum(1 for stix_object in bundle['objects'] if stix_object['type'] == 'relationship'),
+        'counts': {
+            'tactics': len(parser.tactics),
+            'techniques': len(parser.techniques),
+            'mitigations': len(parser.mitigations),
+            'groups': len(parser.groups),
+            'software': len(parser.software),
+            'campaigns': len(parser.campaigns),
+            'datasources': len(parser.datasources),
+        },
+        'timings': stopwatch.timings,
+        'total': sum(stopwatch.timings.values()),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the vault build on synthetic ATT&CK STIX bundles')
+    parser.add_argument('-s', '--scales', help="Bundle sizes, relative to enterprise-attack", type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('-r', '--repeat', help="Number of runs of each scale. The best time of each stage is kept", type=int, default=1)
+    parser.add_argument('-w', '--workers', help="Number of processes used to render the notes", type=int, default=1)
+    parser.add_argument('-o', '--output', help="JSON file in which the results are saved", default='benchmark.json')
+    parser.add_argument('--work-dir', help="Directory for the bundles and the vaults. A temporary directory is used by default")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='mitre-attack-benchmark-')
+    results = list()
+    try:
+        for scale in args.scales:
+            result = benchmark_scale(scale, work_dir, args.repeat, args.workers)
+            results.append(result)
+            print(f"scale {scale}: {result['objects']} objects, {result['total']:.2f} s")
+            for stage, elapsed in result['timings'].items():
+                print(f"  {stage:<24} {elapsed:8.3f} s")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir)
+
+    with open(args.output, 'w') as fd:
+        json.dump({
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'workers': args.workers,
+            'results': results
+        }, fd, indent=2)
+    print(f"Results saved to {args.output}")
@@ -0,0 +1,203 @@
+import argparse
+import json
+import random
+import uuid
+
+TACTICS = ["Reconnaissance", "Resource Development", "Initial Access", "Execution", "Persistence",
+           "Privilege Escalation", "Defense Evasion", "Credential Access", "Discovery", "Lateral Movement",
+           "Collection", "Command and Control", "Exfiltration", "Impact"]
+
+PLATFORMS = ["Windows", "Linux", "macOS", "Network", "Containers", "IaaS", "SaaS", "Office Suite", "Identity Provider"]
+
+PERMISSIONS = ["User", "Administrator", "SYSTEM", "root"]
+
+# Approximate object counts of enterprise-attack 17.0 (scale 1)
+ENTERPRISE_COUNTS = {
+    'techniques': 211,
+    'subtechniques_per_technique': 2.2,
+    'mitigations': 44,
+    'groups': 170,
+    'software': 800,
+    'references': 6000,
+    'group_techniques': 55,
+    'software_techniques': 16,
+    'software_groups': 2,
+    'mitigation_techniques': 30,
+    'campaigns': 47,
+    'campaign_techniques': 25,
+    'campaign_software': 2,
+    'datasources': 38,
+    'components_per_datasource': 2.8,
+    'component_techniques': 16,
+}
+
+COLLECTION_LAYERS = ["Host", "Network", "Cloud Control Plane", "Container", "OSINT"]
+
+TIMESTAMP = "2025-01-01T00:00:00.000Z"
+
+
+class SyntheticBundle():
+    """
+    Generate an ATT&CK-shaped STIX 2.1 bundle. The counts of objects and relationships are the ones
+    of enterprise-attack multiplied by scale. The same seed always generates the same bundle.
+    """
+
+    def __init__(self, scale=1.0, seed=0):
+        self.scale = scale
+        self.random = random.Random(seed)
+        self.source_names = [ f"Source {i}" for i in range(max(1, int(ENTERPRISE_COUNTS['references'] * scale))) ]
+        self.objects = list()
+
+    def _id(self, stix_type):
+        return f"{stix_type}--{uuid.UUID(int=self.random.getrandbits(128), version=4)}"
+
+    def _external_references(self, attack_id=None, count=0):
+        ext_refs = list()
+        if attack_id:
+            ext_refs.append({'source_name': 'mitre-attack',
+                             'external_id': attack_id,
+                             'url': f"https://attack.mitre.org/{attack_id.replace('.', '/')}"})
+        for source_name in self.random.sample(self.source_names, min(count, len(self.source_names))):
+            ext_refs.append({'source_name': source_name,
+                             'description': f"{source_name}. (2024). Report.",
+                             'url': f"https://example.com/{source_name.replace(' ', '-').lower()}"})
+        return ext_refs
+
+    def _description(self, ext_refs, sentences=3):
+        text = ' '.join("Adversaries may use <code>cmd.exe</code> to run commands on the compromised host." for _ in range(sentences))
+        citations = ''.join(f"(Citation: {ext_ref['source_name']})" for ext_ref in ext_refs if ext_ref['source_name'] != 'mitre-attack')
+        return f"{text}{citations}\n\nLorem ipsum dolor sit amet."
+
+    def _object(self, stix_type, name, attack_id, ref_count, **properties):
+        ext_refs = self._external_references(attack_id, ref_count)
+        stix_object = {
+            'type': stix_type,
+            'spec_version': '2.1',
+            'id': self._id(stix_type),
+            'created': TIMESTAMP,
+            'modified': TIMESTAMP,
+            'name': name,
+            'description': self._description(ext_refs),
+            'external_references': ext_refs,
+            'x_mitre_version': '1.0',
+        }
+        stix_object.update(properties)
+        self.objects.append(stix_object)
+        return stix_object
+
+    def _relationship(self, relationship_type, source, target):
+        ext_refs = self._external_references(count=self.random.randint(1, 2))
+        self.objects.append({
+            'type': 'relationship',
+            'spec_version': '2.1',
+            'id': self._id('relationship'),
+            'created': TIMESTAMP,
+            'modified': TIMESTAMP,
+            'relationship_type': relationship_type,
+            'source_ref': source['id'],
+            'target_ref': target['id'],
+            'description': self._description(ext_refs, sentences=1),
+            'external_references': ext_refs,
+        })
+
+    def generate(self):
+        """
+        Generate the bundle and return it as a dict
+        """
+
+        rng = self.random
+        counts = { key: max(1, int(ENTERPRISE_COUNTS[key] * self.scale)) for key in ('techniques', 'mitigations', 'groups', 'software',
+                                                                                      'campaigns', 'datasources') }
+
+        for i, tactic in enumerate(TACTICS):
+            self._object('x-mitre-tactic', tactic, f"TA{i + 1:04d}", 0,
+                         x_mitre_shortname=tactic.lower().replace(' ', '-'))
+
+        techniques = list()
+        for i in range(counts['techniques']):
+            attack_id = f"T{1000 + i}"
+            phases = [ {'kill_chain_name': 'mitre-attack', 'phase_name': tactic.lower().replace(' ', '-')}
+                       for tactic in rng.sample(TACTICS, rng.randint(1, 2)) ]
+            technique = self._object('attack-pattern', f"Technique {i}", attack_id, rng.randint(1, 8),
+                                     kill_chain_phases=phases,
+                                     x_mitre_is_subtechnique=False,
+                                     x_mitre_platforms=rng.sample(PLATFORMS, rng.randint(1, 4)),
+                                     x_mitre_permissions_required=rng.sample(PERMISSIONS, rng.randint(0, 2)))
+            techniques.append(technique)
+            for j in range(int(rng.random() * 2 * ENTERPRISE_COUNTS['subtechniques_per_technique'])):
+                subtechnique = self._object('attack-pattern', f"Technique {i} Variant {j}", f"{attack_id}.{j + 1:03d}", rng.randint(1, 4),
+                                            kill_chain_phases=phases,
+                                            x_mitre_is_subtechnique=True,
+                                            x_mitre_platforms=technique['x_mitre_platforms'])
+                techniques.append(subtechnique)
+                self._relationship('subtechnique-of', subtechnique, technique)
+
+        for i in range(counts['mitigations']):
+            mitigation = self._object('course-of-action', f"Mitigation {i}", f"M{1000 + i}", rng.randint(0, 3))
+            for technique in rng.sample(techniques, min(len(techniques), rng.randint(1, 2 * ENTERPRISE_COUNTS['mitigation_techniques']))):
+                self._relationship('mitigates', mitigation, technique)
+
+        groups = list()
+        for i in range(counts['groups']):
+            group = self._object('intrusion-set', f"Group {i}", f"G{1000 + i}", rng.randint(2, 20),
+                                 aliases=[f"Group {i}", f"Alias {i}"])
+            groups.append(group)
+            for technique in rng.sample(techniques, min(len(techniques), rng.randint(1, 2 * ENTERPRISE_COUNTS['group_techniques']))):
+                self._relationship('uses', group, technique)
+
+        software_objects = list()
+        for i in range(counts['software']):
+            if i % 8 == 0:
+                software = self._object('tool', f"Tool {i}", f"S{1000 + i}", rng.randint(1, 6),
+                                        x_mitre_aliases=[f"Tool {i}"], x_mitre_platforms=["Windows"])
+            else:
+                software = self._object('malware', f"Malware {i}", f"S{1000 + i}", rng.randint(1, 6), is_family=True,
+                                        x_mitre_aliases=[f"Malware {i}"], x_mitre_platforms=["Windows"])
+            for technique in rng.sample(techniques, min(len(techniques), rng.randint(1, 2 * ENTERPRISE_COUNTS['software_techniques']))):
+                self._relationship('uses', software, technique)
+            software_objects.append(software)
+            for group in rng.sample(groups, min(len(groups), rng.randint(0, 2 * ENTERPRISE_COUNTS['software_groups']))):
+                self._relationship('uses', group, software)
+
+        for i in range(counts['campaigns']):
+            campaign = self._object('campaign', f"Campaign {i}", f"C{i + 1:04d}", rng.randint(2, 10),
+                                    aliases=[f"Campaign {i}"], first_seen="2022-01-01T05:00:00.000Z", last_seen="2023-06-01T04:00:00.000Z")
+            self._relationship('attributed-to', campaign, rng.choice(groups))
+            for technique in rng.sample(techniques, min(len(techniques), rng.randint(1, 2 * ENTERPRISE_COUNTS['campaign_techniques']))):
+                self._relationship('uses', campaign, technique)
+            for software in rng.sample(software_objects, min(len(software_objects), rng.randint(0, 2 * ENTERPRISE_COUNTS['campaign_software']))):
+                self._relationship('uses', campaign, software)
+
+        for i in range(counts['datasources']):
+            datasource = self._object('x-mitre-data-source', f"Data Source {i}", f"DS{i + 1:04d}", rng.randint(0, 2),
+                                      x_mitre_platforms=rng.sample(PLATFORMS, rng.randint(1, 4)),
+                                      x_mitre_collection_layers=rng.sample(COLLECTION_LAYERS, rng.randint(1, 2)))
+            for j in range(1 + int(rng.random() * 2 * (ENTERPRISE_COUNTS['components_per_datasource'] - 1))):
+                component = self._object('x-mitre-data-component', f"Data Source {i} Component {j}", None, 0,
+                                         x_mitre_data_source_ref=datasource['id'])
+                for technique in rng.sample(techniques, min(len(techniques), rng.randint(1, 2 * ENTERPRISE_COUNTS['component_techniques']))):
+                    self._relationship('detects', component, technique)
+
+        return {'type': 'bundle', 'id': self._id('bundle'), 'objects': self.objects}
+
+
+def write_bundle(path, scale=1.0, seed=0):
+    """
+    Generate a synthetic bundle and save it to path
+    """
+
+    bundle = SyntheticBundle(scale, seed).generate()
+    with open(path, 'w') as fd:
+        json.dump(bundle, fd)
+    return bundle
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic ATT&CK-shaped STIX bundle')
+    parser.add_argument('path', help="Output file path")
+    parser.add_argument('-s', '--scale', help="Size of the bundle, relative to enterprise-attack", type=float, default=1.0)
+    parser.add_argument('--seed', help="Random seed", type=int, default=0)
+    args = parser.parse_args()
+
+    bundle = write_bundle(args.path, args.scale, args.seed)
+    print(f"{len(bundle['objects'])} objects written to {args.path}")
@@ -0,0 +1,73 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from src import ROOT
+
+# Time the Jinja import, the environment creation and the loading of every template in a new process
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from src.markdown_generator import create_environment
+environment = create_environment({cache_dir!r})
+for template_name in environment.list_templates():
+    environment.get_template(template_name)
+print(time.perf_counter() - start)
+"""
+
+
+def time_startup(cache_dir=None):
+    """
+    Get the template loading time of a new process, with the given template cache directory
+    """
+
+    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT.format(cache_dir=cache_dir)],
+                            cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def benchmark_startup(work_dir, repeat=5):
+    """
+    Time the template loading without cache, with an empty cache (cold) and with a filled cache (warm),
+    keeping the best of the repeated runs
+    """
+
+    cache_dir = os.path.join(work_dir, 'templates')
+    timings = { 'no cache': [], 'cold': [], 'warm': [] }
+    for _ in range(repeat):
+        timings['no cache'].append(time_startup())
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        timings['cold'].append(time_startup(cache_dir))
+        timings['warm'].append(time_startup(cache_dir))
+    return { mode: min(values) for mode, values in timings.items() }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the template loading with a cold and a warm template cache')
+    parser.add_argument('-r', '--repeat', help="Number of runs of each mode. The best time is kept", type=int, default=5)
+    parser.add_argument('-o', '--output', help="JSON file in which the results are saved", default='benchmark-templates.json')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='mitre-attack-benchmark-')
+    try:
+        timings = benchmark_startup(work_dir, args.repeat)
+    finally:
+        shutil.rmtree(work_dir)
+    for mode, elapsed in timings.items():
+        print(f"  {mode:<24} {elapsed * 1000:8.1f} ms")
+
+    with open(args.output, 'w') as fd:
+        json.dump({
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timings': timings
+        }, fd, indent=2)
+    print(f"Results saved to {args.output}")
@@ -1,13 +1,15 @@
-from src.stix_parser import StixParser
-from src.markdown_generator import MarkdownGenerator
-from src.view import create_graph_json
 from src.markdown_reader import MarkdownReader
+from src.technique_index import get_tactics_and_techniques
+from src.profiler import profiler
+from src import ROOT, MITRE_REPO_URL
 
 from loguru import logger
 
 import argparse
+import cProfile
 import os
 import sys
+import time
 import yaml
 import re
 
@@ -17,40 +19,94 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Downdload MITRE ATT&CK STIX data and parse it to Obsidian markdown notes')
 
-    parser.add_argument('-d', '--domain', help="Domain should be 'enterprise-attack', 'mobile-attack' or 'ics-attack'", default='enterprise-attack')
+    parser.add_argument('-d', '--domain', help="Domains should be 'enterprise-attack', 'mobile-attack' or 'ics-attack'. The vault mode accepts more than one domain",
+                        nargs='+', default=['enterprise-attack'])
     parser.add_argument('-o', '--output', help="Output directory in which the notes will be saved. It should be placed inside a Obsidian vault.")
-    parser.add_argument('--generate-hyperlinks', help="Generate techniques hyperlinks in a markdown note file", action="store_true")
+    parser.add_argument('--generate-hyperlinks', help="Generate techniques, groups and software hyperlinks in a markdown note file", action="store_true")
     parser.add_argument('--generate-matrix', help="Create ATT&CK matrix starting from a markdown note file", action="store_true")
     parser.add_argument('--path', help="Filepath to the markdown note file")
+    parser.add_argument('--search', help="Search the ATT&CK objects by terms and \"quoted phrases\" instead of generating notes", metavar='QUERY')
+    parser.add_argument('--type', help="Only search objects of these types (tactic, technique, mitigation, group, software, campaign, datasource)",
+                        nargs='+', dest='types')
+    parser.add_argument('--platform', help="Only search objects related to these platforms", nargs='+', dest='platforms')
+    parser.add_argument('--tactic', help="Only search objects related to these tactics", nargs='+', dest='tactics')
+    parser.add_argument('--limit', help="Maximum number of search results (default: 20, 0 for all of them)", type=int, default=20)
+    parser.add_argument('--watch', help="Watch a folder of notes and link the techniques, groups and software IDs of each note when it changes",
+                        metavar='DIR')
+    parser.add_argument('--debounce', help="Seconds a note must stay unchanged before being linked in watch mode (default: 0.5)",
+                        type=float, default=0.5)
+    parser.add_argument('--serve', help="Serve ATT&CK ID lookups as JSON over HTTP on localhost, from the cached or local STIX data (default port: 8000)",
+                        nargs='?', const=8000, type=int, metavar='PORT')
+    parser.add_argument('--offline', help="Do not use the network: read the STIX data from the cache or from a local file", action="store_true")
+    parser.add_argument('--diff-from', help="Generate only the notes affected by the changes from a previous ATT&CK version (or STIX file) and write a changelog note",
+                        metavar='PREVIOUS')
+    parser.add_argument('--profile', help="Print the time, CPU time, peak memory and items of each stage and save them in a JSON report (default: profile.json)",
+                        nargs='?', const='profile.json', metavar='REPORT')
+    parser.add_argument('--cprofile', help="Save the cProfile statistics of the run in a file", metavar='FILE')
 
     args = parser.parse_args()
 
     with open('config.yml', 'r') as fd:
         config = yaml.safe_load(fd)
 
-    if args.domain:
-        domain = args.domain
+    domains = list(dict.fromkeys(args.domain))
+    for domain in domains:
         if domain not in ('enterprise-attack', 'mobile-attack', 'ics-attack'):
             logger.error(f"The domain {domain} is not suported")
             exit(-1)
+    if len(domains) > 1:
+        if args.generate_hyperlinks or args.generate_matrix:
+            logger.error("The hyperlinks and the matrix can be generated for one domain at a time")
+            exit(-1)
+        if args.search or args.watch or args.serve is not None:
+            logger.error("The search, the watch mode and the lookup server work on one domain at a time")
+            exit(-1)
+        if config['repository-url'] != MITRE_REPO_URL:
+            logger.error("Several domains can only be generated from the MITRE ATT&CK repository")
+            exit(-1)
+        if args.diff_from and os.path.isfile(args.diff_from):
+            logger.error("With several domains, the previous version must be an ATT&CK version")
+            exit(-1)
+        if args.cprofile:
+            logger.warning("With several domains, the cProfile statistics only cover the main process, not the domain worker processes")
+    domain = domains[0]
+
+    if args.profile:
+        profiler.enable()
+    if args.cprofile:
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
+
+    parser_options = {
+        'validate': config.get('validate-stix-data', False),
+        'stream': config.get('stream-stix-data', False),
+        'cache_dir': os.path.join(ROOT, config['cache-dir']) if config.get('cache-dir') else None,
+        'offline': args.offline,
+        'bundle_hashes': config.get('bundle-sha256'),
+        'snapshot_dir': os.path.join(ROOT, config['snapshot-dir']) if config.get('snapshot-dir') else None
+    }
 
     if args.generate_hyperlinks:
         if args.path:
             if os.path.isfile(args.path) and args.path.endswith('.md'):
-                parser = StixParser(config['repository-url'], domain, config.get('version'))
-                logger.info("Extracting objects from STIX data")
-                parser.get_data(techniques=True)
-                markdown_reader = MarkdownReader(args.path)
-                markdown_reader.create_hyperlinks(parser.techniques)
+                from src.note_watcher import get_note_linker
+
+                with profiler.stage('get_note_linker') as stage:
+                    linker = get_note_linker(config['repository-url'], domain, config.get('version'), **parser_options)
+                    stage.items += len(linker.names)
+                with profiler.stage('create_hyperlinks'):
+                    markdown_reader = MarkdownReader(args.path)
+                    markdown_reader.create_hyperlinks(linker)
             else:
                 logger.error("You have not provided a valid markdown file path")
         else:
             logger.error("Provide a file path")
     elif args.generate_matrix:
         if args.path:
-            parser = StixParser(config['repository-url'], domain, config.get('version'))
-            logger.info("Extracting objects from STIX data")
-            parser.get_data(techniques=True, tactics=True)
+            with profiler.stage('get_tactics_and_techniques') as stage:
+                tactics, techniques = get_tactics_and_techniques(config['repository-url'], domain, config.get('version'),
+                                                                 parser_options['snapshot_dir'], **parser_options)
+                stage.items += len(techniques)
 
             if os.path.isfile(args.path):
                 if args.path.endswith('.md'):
@@ -66,11 +122,49 @@ if __name__ == '__main__':
                 found_techniques = []
                 canvas_path = args.path
 
-            markdown_generator = MarkdownGenerator(techniques=parser.techniques, tactics=parser.tactics)
-            markdown_generator.create_canvas(canvas_path, found_techniques)
+            # Only the canvas is needed: the templates are not loaded
+            from src.markdown_generator import MarkdownGenerator
+
+            with profiler.stage('create_canvas'):
+                markdown_generator = MarkdownGenerator(techniques=techniques, tactics=tactics)
+                markdown_generator.create_canvas(canvas_path, found_techniques)
         else:
             logger.error("You must provide a valid file path")
             exit(-1)
+    elif args.serve is not None:
+        from src.lookup_server import serve
+        from src.stix_parser import StixParser
+
+        # The server only uses the cached or local STIX data
+        with profiler.stage('StixParser'):
+            stix_parser = StixParser(config['repository-url'], domain, config.get('version'), **dict(parser_options, offline=True))
+        logger.info("Extracting objects from STIX data")
+        with profiler.stage('get_data'):
+            stix_parser.get_data(tactics=True, techniques=True, mitigations=True, groups=True, software=True, campaigns=True, datasources=True)
+        serve(stix_parser, port=args.serve)
+    elif args.watch:
+        if not os.path.isdir(args.watch):
+            logger.error("You have not provided a valid folder to watch")
+            exit(-1)
+        from src.note_watcher import NoteWatcher, get_note_linker
+
+        with profiler.stage('get_note_linker'):
+            linker = get_note_linker(config['repository-url'], domain, config.get('version'), **parser_options)
+        NoteWatcher(args.watch, linker, args.debounce).run()
+    elif args.search:
+        from src.search_index import get_search_index
+
+        with profiler.stage('get_search_index'):
+            search_index = get_search_index(config['repository-url'], domain, config.get('version'),
+                                            parser_options['snapshot_dir'], **parser_options)
+        with profiler.stage('search') as stage:
+            start = time.perf_counter()
+            results = search_index.search(args.search, args.types, args.platforms, args.tactics, args.limit)
+            elapsed = time.perf_counter() - start
+            stage.items += len(results)
+        for score, document, fields in results:
+            print(f"{score:7.2f}  {document['type']:<10} {document['id'] or '':<10} {document['name']}  ({', '.join(fields)})")
+        logger.info(f"{len(results)} results in {elapsed * 1000:.1f} ms")
     else:
         if args.output:
             if os.path.isdir(args.output):
@@ -83,26 +177,46 @@ if __name__ == '__main__':
             logger.error("You have not provided a valid output directory")
             exit(-1)
     
-        parser = StixParser(config['repository-url'], domain, config.get('version'))
-        logger.info("Extracting objects from STIX data")
-        parser.get_data(tactics=True, techniques=True, mitigations=True, groups=True, software=True)
+        # Imported here since the linker and the matrix modes do not need them
+        from src.domains import generate_domains, merge_shared_objects
+        from src.markdown_generator import MarkdownGenerator
+        from src.view import create_graph_json
+
+        generator_options = {
+            'workers': config.get('workers', 1),
+            'staged': config.get('staged-output', False),
+            'template_cache_dir': os.path.join(ROOT, config['template-cache-dir']) if config.get('template-cache-dir') else None
+        }
+        # With several domains, each one of them has its own subtree. The shared groups and software can be merged
+        merge_domains = len(domains) > 1 and config.get('merge-domains', False)
+        with profiler.stage('generate domains'):
+            builds = generate_domains(config['repository-url'], domains, output_dir, config['mitre-object-types'], config.get('version'),
+                                      args.diff_from, merge_domains, parser_options, **generator_options)
         os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-        markdown_generator = MarkdownGenerator(output_dir, parser.tactics, parser.techniques, parser.mitigations, parser.groups, parser.software)
-        if config['mitre-object-types']['tactics']:
-            logger.info("Creating Tactic notes")
-            markdown_generator.create_tactic_notes()
-        if config['mitre-object-types']['techniques']:
-            logger.info("Creating Technique notes")
-            markdown_generator.create_technique_notes()
-        if config['mitre-object-types']['mitigations']:
-            logger.info("Creating Mitigation notes")
-            markdown_generator.create_mitigation_notes()
-        if config['mitre-object-types']['groups']:
-            logger.info("Creating Group notes")
-            markdown_generator.create_group_notes()
-        if config['mitre-object-types']['software']:
-            logger.info("Creating Software notes")
-            markdown_generator.create_software_notes()
-        
-        create_graph_json(output_dir)
+        if merge_domains:
+            groups, software = merge_shared_objects(builds)
+            affected = set().union(*(build.affected for build in builds)) if args.diff_from else None
+            markdown_generator = MarkdownGenerator(output_dir, groups=groups, software=software, affected=affected, **generator_options)
+            if config['mitre-object-types']['groups']:
+                logger.info("Creating the shared Group notes")
+                with profiler.stage('create_group_notes'):
+                    markdown_generator.create_group_notes()
+            if config['mitre-object-types']['software']:
+                logger.info("Creating the shared Software notes")
+                with profiler.stage('create_software_notes'):
+                    markdown_generator.create_software_notes()
+            with profiler.stage('finalize'):
+                markdown_generator.finalize()
+
+        with profiler.stage('create_graph_json'):
+            create_graph_json(output_dir)
+
+    if args.cprofile:
+        cprofiler.disable()
+        cprofiler.dump_stats(args.cprofile)
+        logger.info(f"cProfile statistics saved in {args.cprofile}")
+    if args.profile:
+        profiler.print_summary()
+        profiler.save(args.profile)
+        logger.info(f"Profile report saved in {args.profile}")
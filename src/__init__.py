@@ -1,3 +1,5 @@
 from pathlib import Path
 
 ROOT = Path(__file__).parent.parent
+
+MITRE_REPO_URL = "https://raw.githubusercontent.com/mitre-attack/attack-stix-data/master"
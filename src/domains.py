@@ -0,0 +1,225 @@
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+import os
+
+from . import ROOT, MITRE_REPO_URL
+from .markdown_generator import MarkdownGenerator, get_environment
+from .models import MITREGroup
+from .profiler import profiler
+from .snapshot import SNAPSHOT_LISTS, dumps_objects, loads_objects
+from .stix_parser import StixParser
+
+
+class DomainBuild():
+    """
+    Parsed objects of an ATT&CK domain, along with the changes from a previous version if requested.
+    It can be sent between processes: the objects are pickled as a snapshot.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.tactics = list()
+        self.techniques = list()
+        self.mitigations = list()
+        self.groups = list()
+        self.software = list()
+        self.campaigns = list()
+        self.datasources = list()
+        self.datacomponents = list()
+        self.objects = dict()
+        # STIX ids of the objects changed since the previous version. None if every note is generated
+        self.affected = None
+        self.changelog_title = None
+        self.changelog_sections = None
+        # Profiler records of the worker process that built the domain
+        self.profile = list()
+
+    def __getstate__(self):
+        state = { name: value for name, value in self.__dict__.items() if name not in SNAPSHOT_LISTS and name != 'objects' }
+        state['_snapshot'] = dumps_objects(self)
+        return state
+
+    def __setstate__(self, state):
+        snapshot = state.pop('_snapshot')
+        self.__dict__.update(state)
+        loads_objects(snapshot, self)
+
+
+def build_domain(repo_url, domain, version=None, diff_from=None, object_types=None, **parser_options):
+    """
+    Parse the STIX data of a domain and build its objects.
+    If object_types is set, only the objects and the relationships shown by the notes of the enabled types are extracted.
+    If diff_from is set, compare it with that previous version or STIX file.
+    """
+
+    build = DomainBuild(domain)
+    with profiler.stage('StixParser'):
+        parser = StixParser(repo_url, domain, version, **parser_options)
+    logger.info(f"Extracting objects from {domain} STIX data")
+    with profiler.stage('get_data'):
+        if object_types is None:
+            parser.get_data(tactics=True, techniques=True, mitigations=True, groups=True, software=True, campaigns=True, datasources=True)
+        else:
+            note_types = [ object_type for object_type, enabled in object_types.items() if enabled ]
+            parser.get_data(links=StixParser.get_note_links(note_types),
+                            **{ object_type: True for object_type in note_types })
+    for list_name in SNAPSHOT_LISTS:
+        setattr(build, list_name, getattr(parser, list_name))
+    build.objects = parser.objects
+
+    if diff_from:
+        from .version_diff import VersionDiff
+
+        logger.info(f"Comparing the {domain} STIX data with {diff_from}")
+        with profiler.stage('version diff'):
+            # The previous version is only compared, its objects are not parsed
+            previous_options = dict(parser_options, snapshot_dir=None)
+            if os.path.isfile(diff_from):
+                previous_label = os.path.basename(diff_from)
+                previous_parser = StixParser(diff_from, domain, **previous_options)
+            else:
+                previous_label = diff_from
+                previous_parser = StixParser(repo_url, domain, diff_from, **previous_options)
+            version_diff = VersionDiff(previous_parser, parser)
+            build.affected = version_diff.get_affected(parser.techniques)
+        logger.info(f"Objects added: {len(version_diff.added)}, changed: {len(version_diff.changed)}, removed: {len(version_diff.removed)}")
+
+        label = (version or 'latest') if repo_url == MITRE_REPO_URL else os.path.basename(repo_url)
+        build.changelog_title = f"Changelog {previous_label} to {label}"
+        build.changelog_sections = version_diff.get_sections()
+    return build
+
+
+def create_domain_notes(build, output_dir, object_types, shared_objects=False, **generator_options):
+    """
+    Create the notes of a domain in output_dir. If shared_objects is set, the group and software notes are not created:
+    they are merged with the ones of the other domains.
+    """
+
+    markdown_generator = MarkdownGenerator(output_dir, build.tactics, build.techniques, build.mitigations, build.groups, build.software,
+                                           build.campaigns, build.datasources, affected=build.affected, **generator_options)
+    if object_types['tactics']:
+        logger.info(f"Creating {build.domain} Tactic notes")
+        with profiler.stage('create_tactic_notes'):
+            markdown_generator.create_tactic_notes()
+    if object_types['techniques']:
+        logger.info(f"Creating {build.domain} Technique notes")
+        with profiler.stage('create_technique_notes'):
+            markdown_generator.create_technique_notes()
+    if object_types['mitigations']:
+        logger.info(f"Creating {build.domain} Mitigation notes")
+        with profiler.stage('create_mitigation_notes'):
+            markdown_generator.create_mitigation_notes()
+    if object_types['groups'] and not shared_objects:
+        logger.info(f"Creating {build.domain} Group notes")
+        with profiler.stage('create_group_notes'):
+            markdown_generator.create_group_notes()
+    if object_types['software'] and not shared_objects:
+        logger.info(f"Creating {build.domain} Software notes")
+        with profiler.stage('create_software_notes'):
+            markdown_generator.create_software_notes()
+    if object_types.get('campaigns'):
+        logger.info(f"Creating {build.domain} Campaign notes")
+        with profiler.stage('create_campaign_notes'):
+            markdown_generator.create_campaign_notes()
+    if object_types.get('datasources'):
+        logger.info(f"Creating {build.domain} Data Source notes")
+        with profiler.stage('create_datasource_notes'):
+            markdown_generator.create_datasource_notes()
+    if build.changelog_title:
+        logger.info(f"Creating the {build.domain} changelog note")
+        markdown_generator.create_changelog_note(build.changelog_title, build.changelog_sections)
+    with profiler.stage('finalize'):
+        markdown_generator.finalize()
+
+
+def _generate_domain(repo_url, domain, version, diff_from, parser_options, output_dir, object_types, shared_objects, generator_options,
+                     profile=False):
+    """
+    Build a domain and create its notes in a worker process.
+    If profile is set, the profiler records of the process are sent back along with the build.
+    """
+
+    profiler.reset()
+    if profile:
+        profiler.enable()
+    with profiler.stage(domain):
+        build = build_domain(repo_url, domain, version, diff_from, object_types, **parser_options)
+        create_domain_notes(build, output_dir, object_types, shared_objects, **generator_options)
+    if not shared_objects:
+        # Nothing else is needed by the main process: do not send the objects back
+        build = DomainBuild(domain)
+    build.profile = list(profiler.records.items())
+    return build
+
+
+def generate_domains(repo_url, domains, output_dir, object_types, version=None, diff_from=None, shared_objects=False,
+                     parser_options={}, **generator_options):
+    """
+    Build the domains and create their notes, each domain in its own subtree of output_dir.
+    With several domains, each one of them is downloaded, parsed and written by its own process.
+    Return the domain builds: they have their objects only if shared_objects is set.
+    """
+
+    if len(domains) == 1:
+        build = build_domain(repo_url, domains[0], version, diff_from, object_types, **parser_options)
+        create_domain_notes(build, output_dir, object_types, shared_objects, **generator_options)
+        return [ build ]
+
+    # With the fork start method, the worker processes inherit the compiled templates.
+    # Otherwise they load them from the template cache, if any
+    environment = get_environment(generator_options.get('template_cache_dir'))
+    for template_name in environment.list_templates():
+        environment.get_template(template_name)
+
+    # The rendering processes are shared out among the domains
+    generator_options = dict(generator_options, workers=max(1, generator_options.get('workers', 1) // len(domains)))
+    with ProcessPoolExecutor(max_workers=min(len(domains), os.cpu_count() or 1)) as executor:
+        futures = list()
+        for domain in domains:
+            domain_dir = os.path.join(output_dir, domain)
+            if not os.path.isdir(os.path.join(ROOT, domain_dir)):
+                os.mkdir(os.path.join(ROOT, domain_dir))
+            futures.append(executor.submit(_generate_domain, repo_url, domain, version, diff_from, parser_options,
+                                           domain_dir, object_types, shared_objects, generator_options, profiler.enabled))
+        builds = [ future.result() for future in futures ]
+    for build in builds:
+        profiler.merge(build.profile)
+    return builds
+
+
+def merge_shared_objects(builds):
+    """
+    Merge the groups and software shared by several domains, which have the same STIX id in each one of them.
+    The first object of each STIX id gets the references and the relationships of the others.
+    Return the merged groups and software.
+    """
+
+    merged = dict()
+    groups = list()
+    software = list()
+    for build in builds:
+        for obj in build.groups + build.software:
+            first = merged.get(obj.internal_id)
+            if first is None:
+                merged[obj.internal_id] = obj
+                (groups if isinstance(obj, MITREGroup) else software).append(obj)
+                continue
+
+            for reference in obj.references:
+                first.references = reference
+            if isinstance(obj, MITREGroup):
+                relationship_lists = (('techniques_used', first.techniques_used, obj.techniques_used),
+                                      ('software_used', first.software_used, obj.software_used),
+                                      ('campaigns', first.campaigns, obj.campaigns))
+            else:
+                relationship_lists = (('groups', first.groups, obj.groups),
+                                      ('techniques_used', first.techniques_used, obj.techniques_used),
+                                      ('campaigns', first.campaigns, obj.campaigns))
+            for name, first_relationships, relationships in relationship_lists:
+                # The relationships between shared objects are in both domains
+                known = { (r.source.internal_id, r.target.internal_id, r.description) for r in first_relationships }
+                for relationship in relationships:
+                    if (relationship.source.internal_id, relationship.target.internal_id, relationship.description) not in known:
+                        setattr(first, name, relationship)
+    return groups, software
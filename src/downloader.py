@@ -0,0 +1,230 @@
+from loguru import logger
+from .snapshot import get_bundle_hash
+import requests
+import binascii
+import base64
+import json
+import os
+import re
+import time
+
+CHUNK_SIZE = 1 << 16
+
+# Connect and read timeouts of each request, in seconds
+TIMEOUT = (10, 60)
+
+# Attempts of a download and exponential backoff between them, in seconds
+ATTEMPTS = 6
+BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+# HTTP statuses worth retrying
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+# Session shared by every download of the process, so that the connections are reused
+_session = None
+
+
+class DownloadError(Exception):
+    """
+    A download failed, even after retrying it
+    """
+
+
+class _RetryableError(Exception):
+    pass
+
+
+def get_session():
+    """
+    Get the HTTP session of the process, creating it on first use
+    """
+
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def _get_digest(headers):
+    """
+    Get the SHA-256 hash announced by the server in a Digest header, if any
+    """
+
+    for digest in headers.get('Digest', '').split(','):
+        algorithm, _, value = digest.strip().partition('=')
+        if algorithm.lower() == 'sha-256' and value:
+            try:
+                return base64.b64decode(value, validate=True).hex()
+            except (binascii.Error, ValueError):
+                # A malformed header is ignored
+                return None
+    return None
+
+
+class Download():
+    """
+    Download a URL to a file in chunks, through a partial file next to it. After an interruption the download is
+    resumed with a Range request, also by a later run if the server gave a validator (ETag or Last-Modified) of the
+    partial content. The size and, when known, the SHA-256 hash of the file are checked before it is moved in place.
+    """
+
+    def __init__(self, url, path, headers=None, sha256=None, session=None, attempts=None, backoff=None):
+        self.url = url
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.state_path = f"{path}.part.json"
+        self.headers = headers or dict()
+        self.sha256 = sha256
+        self.session = session or get_session()
+        self.attempts = attempts or ATTEMPTS
+        self.backoff = BACKOFF if backoff is None else backoff
+        # Response headers of the download, e.g. to revalidate it later
+        self.response_headers = requests.structures.CaseInsensitiveDict()
+
+    def _load_state(self):
+        """
+        Get the validator of the partial file left by a previous run for the same URL
+        """
+
+        try:
+            with open(self.state_path, 'r') as fd:
+                state = json.load(fd)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if state.get('url') != self.url or not os.path.isfile(self.part_path):
+            return None
+        return state.get('validator')
+
+    def _save_state(self, validator):
+        with open(self.state_path, 'w') as fd:
+            json.dump({'url': self.url, 'validator': validator}, fd)
+
+    def _clear(self):
+        for path in (self.part_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _request(self, offset, validator):
+        """
+        Request the content from offset, appending it to the partial file.
+        Return the response status and the expected size of the whole content.
+        """
+
+        # The ranges must refer to the bytes written in the partial file, not to a compressed encoding of them
+        headers = dict(self.headers, **{'Accept-Encoding': 'identity'})
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+            # The server sends the whole content if it has changed since the partial file was written
+            headers['If-Range'] = validator
+            for header in ('If-None-Match', 'If-Modified-Since'):
+                headers.pop(header, None)
+
+        try:
+            response = self.session.get(self.url, headers=headers, stream=True, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _RetryableError(f"Unable to reach {self.url}: {e}")
+
+        with response:
+            if response.status_code == 304:
+                return 304, None
+            if response.status_code in RETRY_STATUSES:
+                raise _RetryableError(f"{response.status_code} - {response.reason}")
+            if response.status_code == 416:
+                # The partial file is not a prefix of the content any more
+                self._clear()
+                raise _RetryableError("The partial download does not match the remote content")
+            if response.status_code not in (200, 206):
+                raise DownloadError(f"An error while reaching the remote source: {response.status_code} - {response.reason}")
+
+            if response.status_code == 206:
+                match = CONTENT_RANGE_PATTERN.match(response.headers.get('Content-Range', ''))
+                if not match or int(match.group(1)) != offset:
+                    self._clear()
+                    raise _RetryableError("Unexpected range in the response")
+                size = int(match.group(3)) if match.group(3) != '*' else None
+                mode = 'ab'
+            else:
+                size = int(response.headers['Content-Length']) if 'Content-Length' in response.headers and \
+                    response.headers.get('Content-Encoding', 'identity') == 'identity' else None
+                mode = 'wb'
+            self.response_headers = response.headers
+
+            validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+            if validator and mode == 'wb':
+                self._save_state(validator)
+            elif not validator and os.path.exists(self.state_path):
+                os.remove(self.state_path)
+
+            try:
+                with open(self.part_path, mode) as fd:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        fd.write(chunk)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                raise _RetryableError(f"The download of {self.url} has been interrupted: {e}")
+            return response.status_code, size
+
+    def _validate(self, size):
+        """
+        Check the size and the hash of the downloaded file
+        """
+
+        actual_size = os.path.getsize(self.part_path)
+        if size is not None and actual_size > size:
+            self._clear()
+            raise _RetryableError(f"The download is larger than expected: {actual_size} of {size} bytes")
+        if size is not None and actual_size < size:
+            raise _RetryableError(f"Incomplete download: {actual_size} of {size} bytes")
+
+        expected_sha256 = self.sha256 or _get_digest(self.response_headers)
+        if expected_sha256 and get_bundle_hash(self.part_path) != expected_sha256.lower():
+            self._clear()
+            raise _RetryableError("The hash of the downloaded file does not match")
+
+    def run(self):
+        """
+        Download the file, retrying with exponential backoff.
+        Return False if the server answered that the content has not been modified (conditional request).
+        """
+
+        validator = self._load_state()
+        if validator is None:
+            self._clear()
+        for attempt in range(self.attempts):
+            offset = os.path.getsize(self.part_path) if validator and os.path.isfile(self.part_path) else 0
+            if offset:
+                logger.info(f"Resuming the download of {self.url} from byte {offset}")
+            try:
+                status, size = self._request(offset, validator)
+                if status == 304:
+                    self._clear()
+                    return False
+                self._validate(size)
+            except _RetryableError as e:
+                if attempt == self.attempts - 1:
+                    raise DownloadError(f"{e}. Giving up after {self.attempts} attempts")
+                delay = min(self.backoff * 2 ** attempt, MAX_BACKOFF)
+                logger.warning(f"{e}. Retrying in {delay:.0f} s")
+                time.sleep(delay)
+                validator = self._load_state()
+                continue
+
+            os.replace(self.part_path, self.path)
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            return True
+
+
+def download(url, path, headers=None, sha256=None, session=None):
+    """
+    Download url to path. Return the Download, or None if the server answered that the content has not been modified.
+    Raise DownloadError if the download fails.
+    """
+
+    job = Download(url, path, headers, sha256, session)
+    return job if job.run() else None
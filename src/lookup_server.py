@@ -0,0 +1,253 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from loguru import logger
+
+import json
+import threading
+import time
+
+# Maximum number of IDs of a batch lookup
+MAX_BATCH_SIZE = 1000
+
+
+def _ref(obj):
+    return {'id': obj.id, 'name': obj.name}
+
+
+def _url(obj):
+    for source_name, url in obj.references:
+        if source_name == 'mitre-attack':
+            return url
+    return None
+
+
+class LookupTable():
+    """
+    Resolve ATT&CK IDs to JSON records of the parsed objects. Each record is encoded on its first lookup
+    and then served from a cache. The counters are safe to update from several threads.
+    """
+
+    def __init__(self, parser):
+        self.objects = dict()
+        for list_name in ('tactics', 'techniques', 'mitigations', 'groups', 'software', 'campaigns', 'datasources'):
+            for obj in getattr(parser, list_name, []):
+                if getattr(obj, 'id', None):
+                    self.objects[obj.id.upper()] = obj
+        self.techniques_by_tactic = dict()
+        for technique in parser.techniques:
+            for tactic in technique.tactics:
+                self.techniques_by_tactic.setdefault(tactic.id, list()).append(technique)
+
+        self._cache = dict()
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {
+            'requests': 0,
+            'errors': 0,
+            'lookups': 0,
+            'not_found': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+        }
+        self.timings = dict()
+
+    def _get_record(self, obj):
+        """
+        Get the record of an object: its fields and the IDs and names of the related objects
+        """
+
+        record = {'id': obj.id, 'type': obj.kind, 'name': obj.name, 'url': _url(obj), 'description': obj.description}
+        if obj.kind == 'tactic':
+            record['shortname'] = obj.shortname
+            record['techniques'] = [ _ref(t) for t in self.techniques_by_tactic.get(obj.id, []) ]
+        elif obj.kind == 'technique':
+            record['is_subtechnique'] = obj.is_subtechnique
+            record['tactics'] = [ _ref(t) for t in obj.tactics ]
+            record['platforms'] = obj.platforms
+            record['permissions_required'] = obj.permissions_required
+            record['subtechniques'] = [ _ref(t) for t in obj.subtechniques ]
+            record['mitigations'] = [ _ref(r['mitigation']) for r in obj.mitigations ]
+            record['groups'] = [ _ref(r['group']) for r in obj.groups ]
+            record['software'] = [ _ref(r['software']) for r in obj.software ]
+            record['campaigns'] = [ _ref(r['campaign']) for r in obj.campaigns ]
+            record['detections'] = [ {'id': r['datacomponent'].datasource.id,
+                                      'name': r['datacomponent'].datasource.name,
+                                      'component': r['datacomponent'].name} for r in obj.detections ]
+        elif obj.kind == 'mitigation':
+            record['techniques'] = [ _ref(r['technique']) for r in obj.mitigates ]
+        elif obj.kind == 'group':
+            record['aliases'] = obj.aliases
+            record['techniques'] = [ _ref(r['technique']) for r in obj.techniques_used ]
+            record['software'] = [ _ref(r['software']) for r in obj.software_used ]
+            record['campaigns'] = [ _ref(r['campaign']) for r in obj.campaigns ]
+        elif obj.kind == 'software':
+            record['techniques'] = [ _ref(r['technique']) for r in obj.techniques_used ]
+            record['groups'] = [ _ref(r['group']) for r in obj.groups ]
+            record['campaigns'] = [ _ref(r['campaign']) for r in obj.campaigns ]
+        elif obj.kind == 'campaign':
+            record['aliases'] = obj.aliases
+            record['first_seen'] = obj.first_seen
+            record['last_seen'] = obj.last_seen
+            record['groups'] = [ _ref(r['group']) for r in obj.groups ]
+            record['techniques'] = [ _ref(r['technique']) for r in obj.techniques_used ]
+            record['software'] = [ _ref(r['software']) for r in obj.software_used ]
+        elif obj.kind == 'datasource':
+            record['platforms'] = obj.platforms
+            record['collection_layers'] = obj.collection_layers
+            record['components'] = [ {'name': component.name,
+                                      'techniques': [ _ref(r['technique']) for r in component.detects ]}
+                                     for component in obj.components ]
+        return record
+
+    def lookup(self, attack_id):
+        """
+        Get the JSON-encoded record of an ATT&CK ID, or None if it is unknown
+        """
+
+        attack_id = attack_id.strip().upper()
+        with self._lock:
+            self.counters['lookups'] += 1
+            encoded = self._cache.get(attack_id)
+            if encoded is not None:
+                self.counters['cache_hits'] += 1
+                return encoded
+        obj = self.objects.get(attack_id)
+        if obj is None:
+            with self._lock:
+                self.counters['not_found'] += 1
+            return None
+        encoded = json.dumps(self._get_record(obj))
+        with self._lock:
+            self.counters['cache_misses'] += 1
+            self._cache[attack_id] = encoded
+        return encoded
+
+    def record_request(self, endpoint, elapsed, error=False):
+        with self._lock:
+            self.counters['requests'] += 1
+            if error:
+                self.counters['errors'] += 1
+            timing = self.timings.setdefault(endpoint, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            timing['count'] += 1
+            timing['total_ms'] += elapsed * 1000
+            timing['max_ms'] = max(timing['max_ms'], elapsed * 1000)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'uptime': round(time.time() - self.started, 3),
+                'objects': len(self.objects),
+                'cached': len(self._cache),
+                'counters': dict(self.counters),
+                'timings': { endpoint: dict(timing, average_ms=timing['total_ms'] / timing['count'])
+                             for endpoint, timing in self.timings.items() },
+            }
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serve the lookups:
+      GET /lookup/<ID>             record of an ID
+      GET /lookup?ids=<ID>,<ID>    records of several IDs
+      POST /lookup {"ids": [...]}  records of several IDs
+      GET /stats                   counters and request timings
+    """
+
+    server_version = 'MITREAttackLookup'
+    table = None
+
+    def _send(self, status, body):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _batch(self, ids):
+        """
+        Get the records of several IDs, null for the unknown ones. The records are already encoded.
+        """
+
+        if len(ids) > MAX_BATCH_SIZE:
+            return 413, json.dumps({'error': f"At most {MAX_BATCH_SIZE} IDs can be looked up at once"})
+        entries = list()
+        for attack_id in dict.fromkeys(ids):
+            entries.append(f"{json.dumps(attack_id)}:{self.table.lookup(attack_id) or 'null'}")
+        return 200, f"{{\"results\":{{{','.join(entries)}}}}}"
+
+    def _handle(self, endpoint, handler):
+        start = time.perf_counter()
+        status = 500
+        try:
+            status = handler()
+        finally:
+            self.table.record_request(endpoint, time.perf_counter() - start, error=status >= 400)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/stats':
+            self._handle('stats', lambda: self._reply(200, json.dumps(self.table.get_stats())))
+        elif url.path.startswith('/lookup/'):
+            self._handle('lookup', lambda: self._lookup(url.path[len('/lookup/'):]))
+        elif url.path == '/lookup':
+            ids = [ attack_id for value in parse_qs(url.query).get('ids', []) for attack_id in value.split(',') if attack_id ]
+            self._handle('batch', lambda: self._reply(*self._batch(ids)))
+        else:
+            self._handle('other', lambda: self._reply(404, json.dumps({'error': f"Unknown path {url.path}"})))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/lookup':
+            self._handle('other', lambda: self._reply(404, json.dumps({'error': f"Unknown path {url.path}"})))
+            return
+
+        def batch():
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                ids = body['ids']
+                if not isinstance(ids, list) or not all(isinstance(attack_id, str) for attack_id in ids):
+                    raise ValueError
+            except (ValueError, KeyError, TypeError):
+                return self._reply(400, json.dumps({'error': "The request body must be a JSON object with a list of IDs: {\"ids\": [...]}"}))
+            return self._reply(*self._batch(ids))
+
+        self._handle('batch', batch)
+
+    def _lookup(self, attack_id):
+        record = self.table.lookup(attack_id)
+        if record is None:
+            return self._reply(404, json.dumps({'error': f"Unknown ID {attack_id}"}))
+        return self._reply(200, record)
+
+    def _reply(self, status, body):
+        self._send(status, body)
+        return status
+
+    def log_message(self, format, *args):
+        logger.trace(f"{self.address_string()} - {format % args}")
+
+
+def create_server(table, host='127.0.0.1', port=8000):
+    """
+    Create the HTTP server of a lookup table. Each request is handled by its own thread.
+    """
+
+    handler = type('LookupRequestHandler', (LookupRequestHandler,), {'table': table})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(parser, host='127.0.0.1', port=8000):
+    """
+    Serve the lookups of the objects extracted by parser until interrupted
+    """
+
+    table = LookupTable(parser)
+    server = create_server(table, host, port)
+    logger.info(f"Serving the lookups of {len(table.objects)} objects on http://{host}:{server.server_port}. Press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info(f"Stopped serving: {table.counters['requests']} requests")
+    finally:
+        server.server_close()
@@ -1,28 +1,244 @@
-from jinja2 import Environment, FileSystemLoader
-from stix2 import Filter
-from stix2 import MemoryStore
 from pathlib import Path
 from loguru import logger
+from concurrent.futures import ProcessPoolExecutor
 from . import ROOT
+from .note_writer import NoteWriter, StagedNoteWriter
+from .profiler import profiler
 
-import requests
+import hashlib
 import os
 import json
 import uuid
-import re
+
+# Hashes of the notes written in the output directory by the last run
+MANIFEST_FILE = ".manifest.json"
+
+# Jinja environment shared by all the generators of the process, and so by all the domains of a run
+_environment = None
+
+CITATION_PREFIX = "(Citation: "
+
+# Footnotes of the last references list, shared by all the descriptions of a note
+_citation_footnotes = (None, None)
+
+
+def create_environment(template_cache_dir=None):
+    """
+    Create the Jinja environment used to render the notes.
+    If template_cache_dir is set, the compiled templates are cached there.
+    """
+
+    from jinja2 import Environment, FileSystemLoader
+
+    bytecode_cache = None
+    if template_cache_dir:
+        from .template_cache import TemplateCache
+
+        bytecode_cache = TemplateCache(template_cache_dir)
+    environment = Environment(loader=FileSystemLoader(os.path.join(ROOT, "res/templates/")), bytecode_cache=bytecode_cache)
+    environment.filters["parse_description"] = MarkdownGenerator.parse_description
+    return environment
+
+
+def get_environment(template_cache_dir=None):
+    """
+    Get the Jinja environment of the process, creating it on first use
+    """
+
+    global _environment
+    if _environment is None:
+        _environment = create_environment(template_cache_dir)
+    return _environment
+
+
+def _render_chunk(template_name, contexts, template_cache_dir=None):
+    """
+    Render a chunk of notes in a worker process
+    """
+
+    template = get_environment(template_cache_dir).get_template(template_name)
+    return [ template.render(**context) for context in contexts ]
+
 
 class MarkdownGenerator():
 
-    def __init__(self, output_dir=None, tactics=[], techniques=[], mitigations=[], groups=[], software=[]):
+    def __init__(self, output_dir=None, tactics=[], techniques=[], mitigations=[], groups=[], software=[], campaigns=[], datasources=[],
+                 workers=1, staged=False, affected=None, template_cache_dir=None):
         if output_dir:
             self.output_dir = os.path.join(ROOT, output_dir)
+            self._manifest = self._load_manifest()
+            self.writer = StagedNoteWriter(self.output_dir) if staged else NoteWriter(self.output_dir)
+        self._written = dict()
+        self.added = list()
+        self.changed = list()
+        self.removed = list()
         self.tactics = tactics
         self.techniques = techniques
         self.mitigations = mitigations
         self.groups = groups
         self.software = software
-        self.environment = Environment(loader=FileSystemLoader(os.path.join(ROOT, "res/templates/")))
-        self.environment.filters["parse_description"] = MarkdownGenerator.parse_description
+        self.campaigns = campaigns
+        self.datasources = datasources
+        self.workers = workers
+        self._executor = None
+        self.template_cache_dir = template_cache_dir
+        # STIX ids of the objects whose notes are generated. The other notes are kept as written by the last run
+        self.affected = affected
+
+    @property
+    def environment(self):
+        """
+        Jinja environment, created on first use: the matrix canvas does not need it
+        """
+
+        return get_environment(self.template_cache_dir)
+
+    @property
+    def executor(self):
+        """
+        Process pool rendering the notes, created on first use and shared by all the note types
+        """
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _render_notes(self, template_name, notes):
+        """
+        Render the notes from their template contexts and write them.
+        With more than one worker, the notes are rendered in chunks by a process pool.
+        """
+
+        with profiler.stage('render notes') as stage:
+            stage.items += len(notes)
+            if self.workers > 1 and len(notes) > 1:
+                chunk_size = -(-len(notes) // (self.workers * 4))
+                chunks = [ notes[i:i + chunk_size] for i in range(0, len(notes), chunk_size) ]
+                results = self.executor.map(_render_chunk,
+                                            [template_name] * len(chunks),
+                                            [ [context for _, context in chunk] for chunk in chunks ],
+                                            [self.template_cache_dir] * len(chunks))
+                contents = [ content for chunk_contents in results for content in chunk_contents ]
+            else:
+                template = self.environment.get_template(template_name)
+                contents = [ template.render(**context) for _, context in notes ]
+
+        with profiler.stage('write notes') as stage:
+            stage.items += len(notes)
+            for (note_file, _), content in zip(notes, contents):
+                self._write_note(note_file, content)
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.output_dir, MANIFEST_FILE), 'r') as fd:
+                return json.load(fd)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return dict()
+
+    def _write_note(self, note_file, content):
+        """
+        Write a note, unless the note written by the last run has the same content
+        """
+
+        note_path = os.path.relpath(note_file, self.output_dir)
+        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        self._written[note_path] = content_hash
+
+        if note_path in self._manifest:
+            if self._manifest[note_path] == content_hash and os.path.isfile(note_file):
+                self.writer.keep(note_path)
+                return
+            self.changed.append(note_path)
+        else:
+            self.added.append(note_path)
+
+        self.writer.write(note_path, content)
+
+    def _keep_note(self, obj, note_file):
+        """
+        Keep the note written by the last run if the object is not affected by the changes.
+        Return False if the note must be generated.
+        """
+
+        if self.affected is None or obj.internal_id in self.affected:
+            return False
+        note_path = os.path.relpath(note_file, self.output_dir)
+        if note_path not in self._manifest or not os.path.isfile(note_file):
+            return False
+        self._written[note_path] = self._manifest[note_path]
+        self.writer.keep(note_path)
+        return True
+
+    def finalize(self):
+        """
+        Remove the notes of the objects that no longer exist, stop the rendering processes, flush the note writer
+        and save the manifest of the written notes. Only the note folders created by this run are cleaned up.
+        """
+
+        note_dirs = { note_path.split(os.sep)[0] for note_path in self._written }
+        manifest = dict()
+        for note_path, content_hash in self._manifest.items():
+            if note_path in self._written:
+                continue
+            if note_path.split(os.sep)[0] in note_dirs:
+                self.writer.remove(note_path)
+                self.removed.append(note_path)
+            else:
+                manifest[note_path] = content_hash
+        manifest.update(self._written)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.writer.close()
+
+        manifest_file = os.path.join(self.output_dir, MANIFEST_FILE)
+        with open(f"{manifest_file}.tmp", 'w') as fd:
+            json.dump(manifest, fd, indent=1, sort_keys=True)
+        os.replace(f"{manifest_file}.tmp", manifest_file)
+        self._manifest = manifest
+        self._written = dict()
+
+        logger.info(f"Notes added: {len(self.added)}, changed: {len(self.changed)}, removed: {len(self.removed)}")
+
+    @staticmethod
+    def _get_footnotes(references):
+        """
+        Get the source name -> footnote id map of a references list.
+        The map is built once per references list.
+        """
+
+        global _citation_footnotes
+        if _citation_footnotes[0] is not references:
+            _citation_footnotes = (references, { ref["source_name"]: ref["id"] for ref in references })
+        return _citation_footnotes[1]
+
+    @staticmethod
+    def _replace_citations(description, footnotes):
+        """
+        Replace each (Citation: <source name>) with its footnote, in a single scan of the description.
+        Source names may contain ')': a citation ends at the first ')' closing a known source name.
+        """
+
+        parts = list()
+        pos = 0
+        while True:
+            start = description.find(CITATION_PREFIX, pos)
+            if start < 0:
+                break
+            name_start = start + len(CITATION_PREFIX)
+            end = description.find(')', name_start)
+            while end >= 0 and description[name_start:end] not in footnotes:
+                end = description.find(')', end + 1)
+            if end < 0:
+                # Unknown source: the citation is left as it is
+                parts.append(description[pos:name_start])
+            else:
+                parts.append(description[pos:start])
+                parts.append(f'[^{footnotes[description[name_start:end]]}] ')
+                name_start = end + 1
+            pos = name_start
+        parts.append(description[pos:])
+        return ''.join(parts)
 
     @staticmethod
     def parse_description(description, references=[]):
@@ -30,40 +246,46 @@ class MarkdownGenerator():
         description = description.replace('</code>', '`')
         description = description.replace('<code>', '`')
 
-        for ref in references:
-            description = re.sub(fr'\(Citation: {ref["source_name"]}\)', f'[^{ref["id"]}] ', description)
+        if references:
+            description = MarkdownGenerator._replace_citations(description, MarkdownGenerator._get_footnotes(references))
         return description
 
     def create_tactic_notes(self):
-        template = self.environment.get_template("tactic.md")
+        notes = list()
         tactics_dir = os.path.join(self.output_dir, "tactics")
         if not os.path.exists(tactics_dir):
             os.mkdir(tactics_dir)
 
         for tactic in self.tactics:
+            tactic_file = os.path.join(tactics_dir, f"{tactic.name}.md")
+            if self._keep_note(tactic, tactic_file):
+                continue
+
             for ref in tactic.references:
                 if ref[0] == 'mitre-attack':
                     mitre_attack = ref[1]
 
-            content = template.render(
+            notes.append((tactic_file, dict(
                     aliases = [tactic.id],
                     mitre_attack = mitre_attack,
                     title = tactic.id,
                     description = tactic.description
-            )
-            tactic_file = os.path.join(tactics_dir, f"{tactic.name}.md")
+            )))
 
-            with open(tactic_file, 'w') as fd:
-                fd.write(content)
+        self._render_notes("tactic.md", notes)
 
 
     def create_technique_notes(self):
-        template = self.environment.get_template("technique.md")
+        notes = list()
         techniques_dir = os.path.join(self.output_dir, "techniques")
         if not os.path.exists(techniques_dir):
             os.mkdir(techniques_dir)
 
         for technique in self.techniques:
+            technique_file = os.path.join(techniques_dir, f"{technique.name}.md")
+            if self._keep_note(technique, technique_file):
+                continue
+
             footnote_id = 1
             references = {}
             for ref in technique.references:
@@ -78,15 +300,10 @@ class MarkdownGenerator():
                     }
                     footnote_id += 1
 
-            tactics = []
-            for kill_chain in technique.kill_chain_phases:
-                if kill_chain["kill_chain_name"] in ('mitre-attack', 'mitre-mobile-attack', 'mitre-ics-attack'):
-                    tactics += [ t.name for t in self.tactics if t.name.lower().replace(' ', '-') == kill_chain["phase_name"].lower() ]
-
-            content = template.render(
+            notes.append((technique_file, dict(
                     aliases = [technique.id],
                     mitre_attack = mitre_attack,
-                    tactics = tactics,
+                    tactics = [ tactic.name for tactic in technique.tactics ],
                     platforms = technique.platforms,
                     permissions_required = technique.permissions_required,
                     title = technique.id,
@@ -96,24 +313,29 @@ class MarkdownGenerator():
                                  "description": sw["description"]} for sw in technique.software] +
                                  [{"name": g["group"].name,
                                  "id": g["group"].id,
-                                 "description": g["description"]} for g in technique.groups],
+                                 "description": g["description"]} for g in technique.groups] +
+                                 [{"name": c["campaign"].name,
+                                 "id": c["campaign"].id,
+                                 "description": c["description"]} for c in technique.campaigns],
                     mitigations = [{"name": m["mitigation"].name,
                                  "id": m["mitigation"].id,
                                  "description": m["description"]} for m in technique.mitigations],
-                    subtechniques = [ subt for subt in self.techniques if subt.is_subtechnique and technique.id in subt.id ],
+                    subtechniques = [ {"name": subt.name,
+                                       "id": subt.id} for subt in technique.subtechniques ],
+                    detections = [{"datasource": d["datacomponent"].datasource.name,
+                                   "id": d["datacomponent"].datasource.id,
+                                   "component": d["datacomponent"].name,
+                                   "description": d["description"]} for d in technique.detections],
                     references = [{"id": value["id"],
                                    "source_name": source_name,
                                    "url": value["url"]} for source_name, value in references.items() ]
-            )
+            )))
 
-            technique_file = os.path.join(techniques_dir, f"{technique.name}.md")
-
-            with open(technique_file, 'w') as fd:
-                fd.write(content)
+        self._render_notes("technique.md", notes)
 
 
     def create_mitigation_notes(self):
-        template = self.environment.get_template("mitigation.md")
+        notes = list()
         
         mitigations_dir = os.path.join(self.output_dir, "mitigations")
         if not os.path.exists(mitigations_dir):
@@ -121,6 +343,8 @@ class MarkdownGenerator():
 
         for mitigation in self.mitigations:
             mitigation_file = os.path.join(mitigations_dir, f"{mitigation.name}.md")
+            if self._keep_note(mitigation, mitigation_file):
+                continue
 
             footnote_id = 1
             references = {}
@@ -136,7 +360,7 @@ class MarkdownGenerator():
                     }
                     footnote_id += 1
 
-            content = template.render(
+            notes.append((mitigation_file, dict(
                     aliases = [mitigation.id],
                     mitre_attack = mitre_attack,
                     title = mitigation.id,
@@ -147,13 +371,13 @@ class MarkdownGenerator():
                     references = [{"id": value["id"],
                                    "source_name": source_name,
                                    "url": value["url"]} for source_name, value in references.items() ]
-            )
-            with open(mitigation_file, 'w') as fd:
-                fd.write(content)
+            )))
+
+        self._render_notes("mitigation.md", notes)
 
 
     def create_group_notes(self):
-        template = self.environment.get_template("group.md")
+        notes = list()
 
         groups_dir = os.path.join(self.output_dir, "groups")
         if not os.path.exists(groups_dir):
@@ -161,6 +385,8 @@ class MarkdownGenerator():
 
         for group in self.groups:
             group_file = os.path.join(groups_dir, f"{group.name}.md")
+            if self._keep_note(group, group_file):
+                continue
 
             footnote_id = 1
             references = {}
@@ -176,7 +402,7 @@ class MarkdownGenerator():
                     }
                     footnote_id += 1
 
-            content = template.render(
+            notes.append((group_file, dict(
                     aliases = group.aliases,
                     mitre_attack = mitre_attack,
                     title = group.id,
@@ -187,15 +413,18 @@ class MarkdownGenerator():
                     software = [{"name": s["software"].name,
                                  "id": s["software"].id,
                                  "description": s["description"]} for s in group.software_used],
+                    campaigns = [{"name": c["campaign"].name,
+                                  "id": c["campaign"].id,
+                                  "description": c["description"]} for c in group.campaigns],
                     references = [{"id": value["id"],
                                    "source_name": source_name,
                                    "url": value["url"]} for source_name, value in references.items() ]
-            )
-            with open(group_file, 'w') as fd:
-                fd.write(content)
+            )))
+
+        self._render_notes("group.md", notes)
 
     def create_software_notes(self):
-        template = self.environment.get_template("software.md")
+        notes = list()
 
         software_dir = os.path.join(self.output_dir, "software")
         if not os.path.exists(software_dir):
@@ -203,6 +432,10 @@ class MarkdownGenerator():
 
 
         for software in self.software:
+            software_file = os.path.join(software_dir, f"{software.name}.md")
+            if self._keep_note(software, software_file):
+                continue
+
             footnote_id = 1
             references = {}
             for ref in software.references:
@@ -232,21 +465,125 @@ class MarkdownGenerator():
                         'description': group["description"]
                     })
 
-            content = template.render(
+            notes.append((software_file, dict(
                     aliases = [software.id],
                     mitre_attack = mitre_attack,
                     title = software.id,
                     description = software.description,
                     techniques = techniques_used,
                     groups = groups,
+                    campaigns = [{"name": c["campaign"].name,
+                                  "id": c["campaign"].id,
+                                  "description": c["description"]} for c in software.campaigns],
                     references = [{"id": value["id"],
                                    "source_name": source_name,
                                    "url": value["url"]} for source_name, value in references.items() ]
-            )
-            software_file = os.path.join(software_dir, f"{software.name}.md")
+            )))
+
+        self._render_notes("software.md", notes)
+
+    def create_campaign_notes(self):
+        notes = list()
+
+        campaigns_dir = os.path.join(self.output_dir, "campaigns")
+        if not os.path.exists(campaigns_dir):
+            os.mkdir(campaigns_dir)
+
+        for campaign in self.campaigns:
+            campaign_file = os.path.join(campaigns_dir, f"{campaign.name}.md")
+            if self._keep_note(campaign, campaign_file):
+                continue
+
+            footnote_id = 1
+            references = {}
+            for ref in campaign.references:
+                if ref[0] == 'mitre-attack':
+                    mitre_attack = ref[1]
+                    continue
+                source_name = ref[0]
+                if source_name not in references:
+                    references[source_name] = {
+                        'id': footnote_id,
+                        'url': ref[1]
+                    }
+                    footnote_id += 1
+
+            notes.append((campaign_file, dict(
+                    aliases = [campaign.id] + [ alias for alias in campaign.aliases if alias != campaign.name ],
+                    mitre_attack = mitre_attack,
+                    first_seen = campaign.first_seen,
+                    last_seen = campaign.last_seen,
+                    title = campaign.id,
+                    description = campaign.description,
+                    groups = [{"name": g["group"].name,
+                               "id": g["group"].id,
+                               "description": g["description"]} for g in campaign.groups],
+                    techniques = [{"name": t["technique"].name,
+                                   "id": t["technique"].id,
+                                   "description": t["description"]} for t in campaign.techniques_used],
+                    software = [{"name": s["software"].name,
+                                 "id": s["software"].id,
+                                 "description": s["description"]} for s in campaign.software_used],
+                    references = [{"id": value["id"],
+                                   "source_name": source_name,
+                                   "url": value["url"]} for source_name, value in references.items() ]
+            )))
+
+        self._render_notes("campaign.md", notes)
+
+    def create_datasource_notes(self):
+        notes = list()
+
+        datasources_dir = os.path.join(self.output_dir, "datasources")
+        if not os.path.exists(datasources_dir):
+            os.mkdir(datasources_dir)
+
+        for datasource in self.datasources:
+            datasource_file = os.path.join(datasources_dir, f"{datasource.name}.md")
+            if self._keep_note(datasource, datasource_file):
+                continue
+
+            footnote_id = 1
+            references = {}
+            for ref in datasource.references:
+                if ref[0] == 'mitre-attack':
+                    mitre_attack = ref[1]
+                    continue
+                source_name = ref[0]
+                if source_name not in references:
+                    references[source_name] = {
+                        'id': footnote_id,
+                        'url': ref[1]
+                    }
+                    footnote_id += 1
+
+            notes.append((datasource_file, dict(
+                    aliases = [datasource.id],
+                    mitre_attack = mitre_attack,
+                    platforms = datasource.platforms,
+                    collection_layers = datasource.collection_layers,
+                    title = datasource.id,
+                    description = datasource.description,
+                    components = [{"name": component.name,
+                                   "description": component.description,
+                                   "techniques": [{"name": t["technique"].name,
+                                                   "id": t["technique"].id,
+                                                   "description": t["description"]} for t in component.detects]}
+                                  for component in datasource.components],
+                    references = [{"id": value["id"],
+                                   "source_name": source_name,
+                                   "url": value["url"]} for source_name, value in references.items() ]
+            )))
+
+        self._render_notes("datasource.md", notes)
+
+    def create_changelog_note(self, title, sections):
+        """
+        Create a note listing the objects added, changed and removed by an ATT&CK version
+        """
 
-            with open(software_file, 'w') as fd:
-                fd.write(content)
+        changelog_file = os.path.join(self.output_dir, f"{title}.md")
+        self._render_notes("changelog.md", [(changelog_file, dict(title=title, sections=sections))])
 
     def create_canvas(self, canvas_name, filtered_techniques=[]):
         canvas = {
@@ -280,17 +617,14 @@ class MarkdownGenerator():
         max_height = y
         for technique in self.techniques:
             if technique.id in filtered_techniques or len(filtered_techniques) == 0:
-                if not technique.is_subtechnique:
-                    for kill_chain in technique.kill_chain_phases:
-                        if kill_chain["kill_chain_name"] in ('mitre-attack', 'mitre-mobile-attack', 'mitre-ics-attack'):
-                            tactic = [ t for t in self.tactics if t.name.lower().replace(' ', '-') == kill_chain["phase_name"].lower() ]
-                            if tactic and len(tactic) > 0: 
-                                if tactic[0].name in rows.keys():
-                                    y = rows[tactic[0].name]
-                                else:
-                                    y = 50
-                                    rows[tactic[0].name] = y
-                                x = columns[tactic[0].name] + 20
+                if not technique.is_subtechnique and technique.tactics:
+                    for tactic in technique.tactics:
+                        if tactic.name in rows.keys():
+                            y = rows[tactic.name]
+                        else:
+                            y = 50
+                            rows[tactic.name] = y
+                        x = columns[tactic.name] + 20
 
                     technique_note_path = f"techniques/{technique.name}.md"
                     technique_node = {
@@ -304,7 +638,7 @@ class MarkdownGenerator():
                             }
                     canvas["nodes"].append(technique_node)
                     y = y + height + 20
-                    subtechniques = [ subt for subt in self.techniques if subt.is_subtechnique and technique.id in subt.id ]
+                    subtechniques = technique.subtechniques
                     if subtechniques:
                         for subt in subtechniques:
                             subtech_note_path = f"techniques/{subt.name}.md"
@@ -320,7 +654,7 @@ class MarkdownGenerator():
                             y = y + height + 20
                             canvas["nodes"].append(subtech_node)
                     
-                    rows[tactic[0].name] = y
+                    rows[tactic.name] = y
                     if y > max_height:
                         max_height = y
 
@@ -1,3 +1,4 @@
+from loguru import logger
 import re
 
 class MarkdownReader():
@@ -8,28 +9,20 @@ class MarkdownReader():
             self.__content = fd.read()
 
     
-    def create_hyperlinks(self, techniques):
-        #regex = "\b(?<!/)T[0-9]{4}(?:\.[0-9]{3})?(?!.*\])\b"
-        regex = "(.)(T[0-9]{4}(?:\.[0-9]{3})?)(.{2})"
-
-        def replace_with_hyperlink(match):
-            prefix = match.group(1)
-            suffix = match.group(3)
-            string = match.group(2)
-
-            if prefix == '|' and suffix == ']]':
-                print(f"{string} is already an internal hyperlink")
-                return match.group(0)
-            else:
-                print(f"creating an internal hyperlink for {string}")
-                technique_name = [ technique.name for technique in techniques if technique.id == string ]
-                if technique_name:
-                    return f" [[{technique_name[0]}\|{string}]] "
-
-        self.__content = re.sub(regex, replace_with_hyperlink, self.__content)
+    def create_hyperlinks(self, linker):
+        """
+        Link the ATT&CK IDs of the note with a NoteLinker, as the notes watched with --watch
+        """
+
+        linked_content = linker.link(self.__content)
+        if linked_content == self.__content:
+            logger.info(f"The ATT&CK IDs of {self.__file_path} are already linked")
+            return
+        self.__content = linked_content
 
         with open(self.__file_path, 'w') as fd:
             fd.write(self.__content)
+        logger.info(f"Linked the ATT&CK IDs of {self.__file_path}")
 
 
     def find_techniques(self):
@@ -1,12 +1,50 @@
 
+import sys
+
+
+class MITRERelationship():
+    """
+    Define a relationship between two MITRE objects.
+    Each end can be read by its type, e.g. relationship['technique'], along with relationship['description'].
+    """
+
+    __slots__ = ('source', 'target', 'description')
+
+    def __init__(self, source, target, description):
+        self.source = source
+        self.target = target
+        self.description = description
+
+    def __getitem__(self, key):
+        if key == 'description':
+            return self.description
+        if self.source.kind == key:
+            return self.source
+        if self.target.kind == key:
+            return self.target
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
 class MITREObject():
     """
     Define a generic MITRE Object
     """
 
+    __slots__ = ('_name', '_description', '_id', '_references')
+
+    # Key of the object in the relationships
+    kind = None
+
     def __init__(self, name):
         self._name = name.replace('/', '／')
-        self._references = set()
+        # Insertion-ordered, so that the footnotes are numbered the same way on every run
+        self._references = dict()
 
     @property
     def name(self):
@@ -34,22 +72,42 @@ class MITREObject():
 
     @property
     def references(self):
-        return self._references
+        return self._references.keys()
 
     @references.setter
     def references(self, reference:tuple):
         if len(reference) != 2:
             raise ValueError("The parameter provided is not supported")
 
-        self._references.add(reference)
+        self._references[reference] = None
 
 class MITRETactic(MITREObject):
     """
     Define a tactic (x-mitre-tactic)
     """
 
+    __slots__ = ('_internal_id', '_shortname')
+    kind = 'tactic'
+
     def __init__(self, name):
         MITREObject.__init__(self, name)
+        self._shortname = name.lower().replace(' ', '-')
+
+    @property
+    def internal_id(self):
+        return self._internal_id
+
+    @internal_id.setter
+    def internal_id(self, internal_id):
+        self._internal_id = internal_id
+
+    @property
+    def shortname(self):
+        return self._shortname
+
+    @shortname.setter
+    def shortname(self, shortname):
+        self._shortname = shortname
 
 
 class MITRETechnique(MITREObject):
@@ -57,12 +115,20 @@ class MITRETechnique(MITREObject):
     Define a technique (attack-pattern)
     """
 
+    __slots__ = ('_internal_id', '_kill_chain_phases', '_is_subtechnique', '_platforms', '_permissions_required',
+                 '_mitigations', '_groups', '_software', '_subtechniques', '_tactics', '_campaigns', '_detections')
+    kind = 'technique'
+
     def __init__(self, name):
         MITREObject.__init__(self, name)
         self._kill_chain_phases = list()
         self._mitigations = list()
         self._groups = list()
         self._software = list()
+        self._subtechniques = list()
+        self._tactics = list()
+        self._campaigns = list()
+        self._detections = list()
 
     @property
     def internal_id(self):
@@ -97,7 +163,7 @@ class MITRETechnique(MITREObject):
 
     @platforms.setter
     def platforms(self, platforms):
-        self._platforms = platforms
+        self._platforms = [ sys.intern(platform) for platform in platforms ]
 
     @property
     def permissions_required(self):
@@ -105,14 +171,14 @@ class MITRETechnique(MITREObject):
 
     @permissions_required.setter
     def permissions_required(self, permissions_required):
-        self._permissions_required = permissions_required
+        self._permissions_required = [ sys.intern(permission) for permission in permissions_required ]
 
     @property
     def mitigations(self):
         return self._mitigations
 
     @mitigations.setter
-    def mitigations(self, mitigation:dict):
+    def mitigations(self, mitigation:MITRERelationship):
         self._mitigations.append(mitigation)
 
     @property
@@ -120,7 +186,7 @@ class MITRETechnique(MITREObject):
         return self._groups
 
     @groups.setter
-    def groups(self, group:dict):
+    def groups(self, group:MITRERelationship):
         self.groups.append(group)
 
     @property
@@ -128,15 +194,80 @@ class MITRETechnique(MITREObject):
         return self._software
 
     @software.setter
-    def software(self, software:dict):
+    def software(self, software:MITRERelationship):
         self.software.append(software)
 
+    @property
+    def campaigns(self):
+        return self._campaigns
+
+    @campaigns.setter
+    def campaigns(self, campaign:MITRERelationship):
+        self._campaigns.append(campaign)
+
+    @property
+    def detections(self):
+        return self._detections
+
+    @detections.setter
+    def detections(self, detection:MITRERelationship):
+        self._detections.append(detection)
+
+    @property
+    def tactics(self):
+        return self._tactics
+
+    @tactics.setter
+    def tactics(self, tactic):
+        self._tactics.append(tactic)
+
+    @property
+    def subtechniques(self):
+        return self._subtechniques
+
+    @staticmethod
+    def link_tactics(techniques, tactics):
+        """
+        Attach to each technique the tactics of its ATT&CK kill chain phases.
+        Return the phase name -> tactic map.
+        """
+
+        tactics_by_phase = { tactic.shortname: tactic for tactic in tactics }
+        for technique in techniques:
+            technique._tactics = list()
+            for kill_chain in technique.kill_chain_phases:
+                if kill_chain["kill_chain_name"] in ('mitre-attack', 'mitre-mobile-attack', 'mitre-ics-attack'):
+                    tactic = tactics_by_phase.get(kill_chain["phase_name"].lower())
+                    if tactic:
+                        technique._tactics.append(tactic)
+        return tactics_by_phase
+
+    @staticmethod
+    def link_subtechniques(techniques):
+        """
+        Attach to each technique its subtechniques, sorted by ID
+        """
+
+        parents = { technique.id: technique for technique in techniques if not technique.is_subtechnique }
+        for technique in techniques:
+            technique._subtechniques = list()
+        for technique in techniques:
+            if technique.is_subtechnique:
+                parent = parents.get(technique.id.split('.')[0])
+                if parent:
+                    parent._subtechniques.append(technique)
+        for parent in parents.values():
+            parent._subtechniques.sort(key=lambda subtechnique: subtechnique.id)
+
 
 class MITREMitigation(MITREObject):
     """
     Define a mitigation (course-of-action)
     """
 
+    __slots__ = ('_is_deprecated', '_internal_id', '_mitigates')
+    kind = 'mitigation'
+
     def __init__(self, name):
         MITREObject.__init__(self, name)
         self._mitigates = list()
@@ -162,7 +293,7 @@ class MITREMitigation(MITREObject):
         return self._mitigates
 
     @mitigates.setter
-    def mitigates(self, mitigated_technique:dict):
+    def mitigates(self, mitigated_technique:MITRERelationship):
         self._mitigates.append(mitigated_technique)
 
 
@@ -171,11 +302,15 @@ class MITREGroup(MITREObject):
     Define a group
     """
 
+    __slots__ = ('_internal_id', '_aliases', '_techniques_used', '_software_used', '_campaigns')
+    kind = 'group'
+
     def __init__(self, name):
         MITREObject.__init__(self, name)
         self._aliases = list()
         self._techniques_used = list()
         self._software_used = list()
+        self._campaigns = list()
 
     @property
     def internal_id(self):
@@ -198,7 +333,7 @@ class MITREGroup(MITREObject):
         return self._techniques_used
 
     @techniques_used.setter
-    def techniques_used(self, technique_used:dict):
+    def techniques_used(self, technique_used:MITRERelationship):
         self._techniques_used.append(technique_used)
 
     @property
@@ -206,20 +341,32 @@ class MITREGroup(MITREObject):
         return self._software_used
 
     @software_used.setter
-    def software_used(self, software_used:dict):
+    def software_used(self, software_used:MITRERelationship):
         self._software_used.append(software_used)
 
+    @property
+    def campaigns(self):
+        return self._campaigns
+
+    @campaigns.setter
+    def campaigns(self, campaign:MITRERelationship):
+        self._campaigns.append(campaign)
+
 
 class MITRESoftware(MITREObject):
     """
     Define a Software
     """
 
+    __slots__ = ('_internal_id', '_aliases', '_groups', '_techniques_used', '_campaigns')
+    kind = 'software'
+
     def __init__(self, name):
         MITREObject.__init__(self, name)
         self._aliases = list()
         self._groups = list()
         self._techniques_used = list()
+        self._campaigns = list()
 
     @property
     def internal_id(self):
@@ -242,7 +389,7 @@ class MITRESoftware(MITREObject):
         return self._groups
 
     @groups.setter
-    def groups(self, group:dict):
+    def groups(self, group:MITRERelationship):
         self._groups.append(group)
 
     @property
@@ -250,5 +397,170 @@ class MITRESoftware(MITREObject):
         return self._techniques_used
 
     @techniques_used.setter
-    def techniques_used(self, technique_used:dict):
+    def techniques_used(self, technique_used:MITRERelationship):
         self._techniques_used.append(technique_used)
+
+    @property
+    def campaigns(self):
+        return self._campaigns
+
+    @campaigns.setter
+    def campaigns(self, campaign:MITRERelationship):
+        self._campaigns.append(campaign)
+
+
+class MITRECampaign(MITREObject):
+    """
+    Define a campaign
+    """
+
+    __slots__ = ('_internal_id', '_aliases', '_first_seen', '_last_seen', '_groups', '_techniques_used', '_software_used')
+    kind = 'campaign'
+
+    def __init__(self, name):
+        MITREObject.__init__(self, name)
+        self._aliases = list()
+        self._groups = list()
+        self._techniques_used = list()
+        self._software_used = list()
+
+    @property
+    def internal_id(self):
+        return self._internal_id
+
+    @internal_id.setter
+    def internal_id(self, internal_id):
+        self._internal_id = internal_id
+
+    @property
+    def aliases(self):
+        return self._aliases
+
+    @aliases.setter
+    def aliases(self, alias):
+        self._aliases = alias
+
+    @property
+    def first_seen(self):
+        return self._first_seen
+
+    @first_seen.setter
+    def first_seen(self, first_seen):
+        self._first_seen = first_seen
+
+    @property
+    def last_seen(self):
+        return self._last_seen
+
+    @last_seen.setter
+    def last_seen(self, last_seen):
+        self._last_seen = last_seen
+
+    @property
+    def groups(self):
+        return self._groups
+
+    @groups.setter
+    def groups(self, group:MITRERelationship):
+        self._groups.append(group)
+
+    @property
+    def techniques_used(self):
+        return self._techniques_used
+
+    @techniques_used.setter
+    def techniques_used(self, technique_used:MITRERelationship):
+        self._techniques_used.append(technique_used)
+
+    @property
+    def software_used(self):
+        return self._software_used
+
+    @software_used.setter
+    def software_used(self, software_used:MITRERelationship):
+        self._software_used.append(software_used)
+
+
+class MITREDataSource(MITREObject):
+    """
+    Define a data source (x-mitre-data-source)
+    """
+
+    __slots__ = ('_internal_id', '_platforms', '_collection_layers', '_components')
+    kind = 'datasource'
+
+    def __init__(self, name):
+        MITREObject.__init__(self, name)
+        self._platforms = list()
+        self._collection_layers = list()
+        self._components = list()
+
+    @property
+    def internal_id(self):
+        return self._internal_id
+
+    @internal_id.setter
+    def internal_id(self, internal_id):
+        self._internal_id = internal_id
+
+    @property
+    def platforms(self):
+        return self._platforms
+
+    @platforms.setter
+    def platforms(self, platforms):
+        self._platforms = [ sys.intern(platform) for platform in platforms ]
+
+    @property
+    def collection_layers(self):
+        return self._collection_layers
+
+    @collection_layers.setter
+    def collection_layers(self, collection_layers):
+        self._collection_layers = [ sys.intern(layer) for layer in collection_layers ]
+
+    @property
+    def components(self):
+        return self._components
+
+    @components.setter
+    def components(self, component):
+        self._components.append(component)
+
+
+class MITREDataComponent(MITREObject):
+    """
+    Define a data component (x-mitre-data-component) of a data source
+    """
+
+    __slots__ = ('_internal_id', '_datasource', '_detects')
+    kind = 'datacomponent'
+
+    def __init__(self, name):
+        MITREObject.__init__(self, name)
+        self._datasource = None
+        self._detects = list()
+
+    @property
+    def internal_id(self):
+        return self._internal_id
+
+    @internal_id.setter
+    def internal_id(self, internal_id):
+        self._internal_id = internal_id
+
+    @property
+    def datasource(self):
+        return self._datasource
+
+    @datasource.setter
+    def datasource(self, datasource):
+        self._datasource = datasource
+
+    @property
+    def detects(self):
+        return self._detects
+
+    @detects.setter
+    def detects(self, detected_technique:MITRERelationship):
+        self._detects.append(detected_technique)
@@ -0,0 +1,176 @@
+from loguru import logger
+
+import shutil
+import os
+import re
+import time
+
+# ATT&CK IDs of techniques, groups and software which are not already part of a link or of a URL
+ID_PATTERN = re.compile(r"(?<![\w|/\[.-])(T[0-9]{4}(?:\.[0-9]{3})?|G[0-9]{4}|S[0-9]{4})(?![\w]|\.[0-9]|\]\])")
+
+# The front matter and the code blocks are not linked
+SKIPPED_PATTERN = re.compile(r"\A---\n.*?\n---\n|^```.*?^```|`[^`\n]*`", re.DOTALL | re.MULTILINE)
+
+NOTE_EXTENSION = '.md'
+
+
+class NoteLinker():
+    """
+    Replace the ATT&CK IDs of techniques, groups and software in a note with links to their notes
+    """
+
+    def __init__(self, objects):
+        self.names = { obj.id: obj.name for obj in objects if getattr(obj, 'id', None) }
+
+    def _link_ids(self, text):
+        def replace(match):
+            attack_id = match.group(1)
+            name = self.names.get(attack_id)
+            if name is None:
+                return attack_id
+            return f"[[{name}\\|{attack_id}]]"
+
+        return ID_PATTERN.sub(replace, text)
+
+    def link(self, content):
+        """
+        Get the content of a note with its ATT&CK IDs linked. Linking an already linked note does not change it.
+        """
+
+        parts = list()
+        pos = 0
+        for match in SKIPPED_PATTERN.finditer(content):
+            parts.append(self._link_ids(content[pos:match.start()]))
+            parts.append(match.group(0))
+            pos = match.end()
+        parts.append(self._link_ids(content[pos:]))
+        return ''.join(parts)
+
+
+class NoteWatcher():
+    """
+    Poll a folder of notes and link each note some time after it has changed (debounce).
+    A note is rewritten only if its links have changed, and the changes made by the watcher itself are ignored.
+    """
+
+    def __init__(self, watch_dir, linker, debounce=0.5, interval=0.1):
+        self.watch_dir = watch_dir
+        self.linker = linker
+        self.debounce = debounce
+        self.interval = interval
+        # Size and modification time of each note when last seen
+        self._seen = dict()
+        # Notes changed since they were last seen, with the time of their last change
+        self._pending = dict()
+        self.linked = 0
+        self.rewritten = 0
+
+    @staticmethod
+    def _get_signature(note_file):
+        stat = os.stat(note_file)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _scan(self):
+        """
+        Get the signatures of the notes of the watched folder
+        """
+
+        signatures = dict()
+        for dirpath, dirnames, filenames in os.walk(self.watch_dir):
+            # Hidden folders, e.g. .obsidian, are not watched
+            dirnames[:] = [ dirname for dirname in dirnames if not dirname.startswith('.') ]
+            for filename in filenames:
+                if filename.endswith(NOTE_EXTENSION) and not filename.startswith('.'):
+                    note_file = os.path.join(dirpath, filename)
+                    try:
+                        signatures[note_file] = self._get_signature(note_file)
+                    except FileNotFoundError:
+                        pass
+        return signatures
+
+    def poll(self, now=None):
+        """
+        Look for changed notes and link the ones that have not changed for the debounce delay
+        """
+
+        now = time.monotonic() if now is None else now
+        signatures = self._scan()
+        for note_file, signature in signatures.items():
+            if self._seen.get(note_file) != signature:
+                self._pending[note_file] = now
+        for note_file in self._seen.keys() - signatures.keys():
+            self._pending.pop(note_file, None)
+        self._seen = signatures
+
+        for note_file, changed in list(self._pending.items()):
+            if now - changed >= self.debounce:
+                del self._pending[note_file]
+                self._link_note(note_file)
+
+    def _link_note(self, note_file):
+        """
+        Link a note, rewriting it only if its content changes
+        """
+
+        start = time.perf_counter()
+        try:
+            signature = self._get_signature(note_file)
+            with open(note_file, 'r') as fd:
+                content = fd.read()
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning(f"Unable to read the note {note_file}: {e}")
+            return
+        self.linked += 1
+
+        linked_content = self.linker.link(content)
+        if linked_content == content:
+            return
+
+        tmp_file = os.path.join(os.path.dirname(note_file), f".{os.path.basename(note_file)}.tmp")
+        try:
+            with open(tmp_file, 'w') as fd:
+                fd.write(linked_content)
+            shutil.copymode(note_file, tmp_file)
+            if self._get_signature(note_file) != signature:
+                # Edited again while being linked: it will be linked after the next debounce delay
+                os.remove(tmp_file)
+                return
+            os.replace(tmp_file, note_file)
+            # The watcher's own write is not a change
+            self._seen[note_file] = self._get_signature(note_file)
+        except OSError as e:
+            # E.g. the note has been deleted or renamed meanwhile
+            logger.warning(f"Unable to link the note {note_file}: {e}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return
+        self.rewritten += 1
+        logger.info(f"Linked {os.path.relpath(note_file, self.watch_dir)} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def run(self):
+        """
+        Watch the folder until interrupted. The notes already in the folder are linked only once they change.
+        """
+
+        self._seen = self._scan()
+        logger.info(f"Watching {len(self._seen)} notes in {self.watch_dir}. Press Ctrl+C to stop")
+        try:
+            while True:
+                self.poll()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            logger.info(f"Stopped watching: {self.rewritten} notes linked")
+
+
+def get_note_linker(repo_url, domain, version=None, **parser_options):
+    """
+    Get a linker of the techniques, groups and software of a domain. Their relationships are not extracted.
+    """
+
+    # The STIX parser and its dependencies are slow to import
+    from .stix_parser import StixParser
+
+    parser = StixParser(repo_url, domain, version, **parser_options)
+    logger.info("Extracting techniques, groups and software from STIX data")
+    parser.get_data(techniques=True, groups=True, software=True, links=())
+    return NoteLinker(parser.techniques + parser.groups + parser.software)
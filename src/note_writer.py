@@ -0,0 +1,210 @@
+from loguru import logger
+import threading
+import shutil
+import ctypes
+import errno
+import queue
+import sys
+import os
+
+STAGING_DIR = ".staging"
+
+# A note folder moved away while being replaced
+OLD_SUFFIX = ".old"
+
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+
+class NoteWriter():
+    """
+    Write the notes straight into the output directory
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+    def write(self, note_path, content):
+        with open(os.path.join(self.output_dir, note_path), 'w') as fd:
+            fd.write(content)
+
+    def keep(self, note_path):
+        """
+        Keep a note written by a previous run
+        """
+
+        pass
+
+    def remove(self, note_path):
+        note_file = os.path.join(self.output_dir, note_path)
+        if os.path.isfile(note_file):
+            os.remove(note_file)
+
+    def close(self):
+        pass
+
+
+def _link_or_copy(source, destination):
+    """
+    Hard-link a file, or copy it on the filesystems without hard links
+    """
+
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def _exchange(path, other_path):
+    """
+    Exchange two paths atomically with renameat2(RENAME_EXCHANGE). Return False where it is not available.
+    """
+
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError, TypeError):
+        return False
+    renameat2.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+    if renameat2(AT_FDCWD, os.fsencode(path), AT_FDCWD, os.fsencode(other_path), RENAME_EXCHANGE) == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+        return False
+    raise OSError(error, os.strerror(error), path)
+
+
+def _carry_over(source_dir, target_dir, note_dir, excluded=()):
+    """
+    Link or copy into target_dir the files of source_dir that it does not have, except the excluded note paths
+    """
+
+    if not os.path.isdir(source_dir):
+        return
+    os.makedirs(target_dir, exist_ok=True)
+    for file_name in os.listdir(source_dir):
+        note_path = os.path.join(note_dir, file_name)
+        source = os.path.join(source_dir, file_name)
+        target = os.path.join(target_dir, file_name)
+        if note_path in excluded or os.path.lexists(target):
+            continue
+        if os.path.isdir(source):
+            shutil.copytree(source, target, copy_function=_link_or_copy)
+        else:
+            _link_or_copy(source, target)
+
+
+class StagedNoteWriter(NoteWriter):
+    """
+    Write the notes into a staging directory through a background thread fed by a bounded queue.
+    On close, each note folder of the output directory is swapped with its staged copy, atomically where the system
+    can exchange two paths, otherwise with two renames. A swap interrupted by a crash is rolled back by the next run.
+    """
+
+    def __init__(self, output_dir, queue_size=256):
+        NoteWriter.__init__(self, output_dir)
+        self.staging_dir = os.path.join(output_dir, STAGING_DIR)
+        if os.path.exists(self.staging_dir):
+            self._recover()
+            shutil.rmtree(self.staging_dir)
+        os.makedirs(self.staging_dir)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._note_dirs = set()
+        self._removed = set()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _recover(self):
+        """
+        Put back the note folders moved away by an interrupted swap, so that the staging directory only holds copies
+        """
+
+        for name in os.listdir(self.staging_dir):
+            old_dir = os.path.join(self.staging_dir, name)
+            if not name.endswith(OLD_SUFFIX) or not os.path.isdir(old_dir):
+                continue
+            target_dir = os.path.join(self.output_dir, name[:-len(OLD_SUFFIX)])
+            if not os.path.exists(target_dir):
+                logger.warning(f"Rolling back the interrupted swap of {target_dir}")
+                os.rename(old_dir, target_dir)
+
+    def _run(self):
+        created_dirs = set()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error:
+                continue
+            note_path, content = item
+            try:
+                staged_file = os.path.join(self.staging_dir, note_path)
+                staged_dir = os.path.dirname(staged_file)
+                if staged_dir not in created_dirs:
+                    os.makedirs(staged_dir, exist_ok=True)
+                    created_dirs.add(staged_dir)
+                if content is None:
+                    # The note is unchanged: link it instead of copying it
+                    _link_or_copy(os.path.join(self.output_dir, note_path), staged_file)
+                else:
+                    with open(staged_file, 'w') as fd:
+                        fd.write(content)
+            except OSError as e:
+                self._error = e
+
+    def write(self, note_path, content):
+        self._note_dirs.add(note_path.split(os.sep)[0])
+        self._queue.put((note_path, content))
+
+    def keep(self, note_path):
+        self._note_dirs.add(note_path.split(os.sep)[0])
+        self._queue.put((note_path, None))
+
+    def remove(self, note_path):
+        self._removed.add(note_path)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error:
+            shutil.rmtree(self.staging_dir)
+            raise self._error
+
+        # Notes written at the top of the output directory are replaced on their own
+        note_files = { note_dir for note_dir in self._note_dirs if os.path.isfile(os.path.join(self.staging_dir, note_dir)) }
+        for note_file in note_files:
+            os.replace(os.path.join(self.staging_dir, note_file), os.path.join(self.output_dir, note_file))
+        self._note_dirs -= note_files
+
+        # Keep the files of the folders that have not been created by this script
+        for note_dir in self._note_dirs:
+            _carry_over(os.path.join(self.output_dir, note_dir), os.path.join(self.staging_dir, note_dir), note_dir, self._removed)
+
+        for note_dir in self._note_dirs:
+            self._swap(note_dir)
+        logger.info(f"Swapped the staged folders into {self.output_dir}: {', '.join(sorted(self._note_dirs))}")
+
+        shutil.rmtree(self.staging_dir)
+
+    def _swap(self, note_dir):
+        """
+        Replace a note folder with its staged copy
+        """
+
+        target_dir = os.path.join(self.output_dir, note_dir)
+        staged_dir = os.path.join(self.staging_dir, note_dir)
+        if not os.path.exists(target_dir):
+            os.rename(staged_dir, target_dir)
+            return
+        if _exchange(staged_dir, target_dir):
+            old_dir = staged_dir
+        else:
+            # Until the second rename, the folder is only found at old_dir: the next run puts it back
+            old_dir = os.path.join(self.staging_dir, f"{note_dir}{OLD_SUFFIX}")
+            os.rename(target_dir, old_dir)
+            os.rename(staged_dir, target_dir)
+        # The files added to the folder while it was being replaced are carried over
+        _carry_over(old_dir, target_dir, note_dir, self._removed)
@@ -0,0 +1,151 @@
+import json
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+class StageRecord():
+    """
+    Accumulated measures of a profiled stage
+    """
+
+    __slots__ = ('name', 'depth', 'calls', 'wall_time', 'cpu_time', 'peak_memory', 'items')
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory = 0
+        self.items = 0
+
+    def as_dict(self):
+        return { name: getattr(self, name) for name in self.__slots__ }
+
+
+class _Stage():
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        profiler = self.profiler
+        if profiler.stack:
+            # Keep the peak reached by the enclosing stage before measuring this one
+            parent = profiler.stack[-1][0]
+            parent.peak_memory = max(parent.peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+        key = tuple(parent.name for parent, _, _ in profiler.stack) + (self.name,)
+        record = profiler.records.get(key)
+        if record is None:
+            record = profiler.records[key] = StageRecord(self.name, len(profiler.stack))
+        profiler.stack.append((record, time.perf_counter(), time.process_time()))
+        return record
+
+    def __exit__(self, *exc_info):
+        profiler = self.profiler
+        record, wall_start, cpu_start = profiler.stack.pop()
+        record.calls += 1
+        record.wall_time += time.perf_counter() - wall_start
+        record.cpu_time += time.process_time() - cpu_start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        record.peak_memory = max(record.peak_memory, peak_memory)
+        if profiler.stack:
+            parent = profiler.stack[-1][0]
+            parent.peak_memory = max(parent.peak_memory, peak_memory)
+        tracemalloc.reset_peak()
+        return False
+
+
+class _DisabledStage():
+    """
+    Stage used when profiling is disabled: it measures nothing
+    """
+
+    def __init__(self):
+        self.record = StageRecord(None, 0)
+
+    def __enter__(self):
+        return self.record
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class Profiler():
+    """
+    Record wall time, CPU time, peak memory (Python allocations) and processed items of each stage of a run.
+    The measures of the stages called more than once from the same enclosing stages are accumulated.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = dict()
+        self.stack = list()
+        self._disabled_stage = _DisabledStage()
+
+    def enable(self):
+        self.enabled = True
+        tracemalloc.start()
+
+    def reset(self):
+        """
+        Drop the records, e.g. those inherited by a forked worker process
+        """
+
+        self.records = dict()
+        self.stack = list()
+
+    def merge(self, records):
+        """
+        Add the records of a worker process under the current stage
+        """
+
+        prefix = tuple(parent.name for parent, _, _ in self.stack)
+        for key, record in records:
+            merged = self.records.get(prefix + key)
+            if merged is None:
+                merged = self.records[prefix + key] = StageRecord(record.name, len(prefix) + record.depth)
+            merged.calls += record.calls
+            merged.wall_time += record.wall_time
+            merged.cpu_time += record.cpu_time
+            merged.peak_memory = max(merged.peak_memory, record.peak_memory)
+            merged.items += record.items
+
+    def stage(self, name):
+        """
+        Context manager measuring a stage. The record it returns has an items counter.
+        """
+
+        if not self.enabled:
+            return self._disabled_stage
+        return _Stage(self, name)
+
+    def report(self):
+        report = { 'stages': [ record.as_dict() for record in self.records.values() ] }
+        if resource:
+            # kB on Linux, bytes on macOS
+            report['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return report
+
+    def print_summary(self):
+        print(f"{'Stage':<40} {'Calls':>7} {'Wall (s)':>10} {'CPU (s)':>10} {'Peak (MB)':>10} {'Items':>8}")
+        for record in self.records.values():
+            name = f"{'  ' * record.depth}{record.name}"
+            print(f"{name:<40} {record.calls:>7} {record.wall_time:>10.3f} {record.cpu_time:>10.3f} "
+                  f"{record.peak_memory / 1e6:>10.1f} {record.items:>8}")
+
+    def save(self, path):
+        with open(path, 'w') as fd:
+            json.dump(self.report(), fd, indent=2)
+
+
+profiler = Profiler()
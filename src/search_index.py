@@ -0,0 +1,268 @@
+from loguru import logger
+from .technique_index import get_index_path
+
+import json
+import math
+import os
+import re
+
+# Increase it whenever the index content changes
+INDEX_VERSION = 1
+
+# Indexed fields and their weight in the ranking
+FIELDS = ('name', 'aliases', 'description', 'relationships')
+FIELD_WEIGHTS = (3.0, 3.0, 1.0, 0.5)
+
+# Term frequency saturation of the ranking
+TF_SATURATION = 1.2
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+MARKUP_PATTERN = re.compile(r"\(Citation: [^)]*\)|<[^>]+>")
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text):
+    """
+    Split a text into lowercase terms, dropping the citations and the HTML tags
+    """
+
+    return TOKEN_PATTERN.findall(MARKUP_PATTERN.sub(' ', text.lower()))
+
+
+def parse_query(query):
+    """
+    Split a query into its terms and its "quoted phrases". Each one of them is returned as a list of terms.
+    """
+
+    clauses = list()
+    for phrase, term in QUERY_PATTERN.findall(query):
+        tokens = tokenize(phrase if phrase else term)
+        if tokens:
+            clauses.append(tokens)
+    return clauses
+
+
+def _relationship_text(relationship, obj):
+    """
+    Get the indexed text of a relationship of obj: the ID and the name of the other end, and the description
+    """
+
+    other = relationship.target if relationship.source is obj else relationship.source
+    return f"{getattr(other, 'id', '') or ''} {other.name} {relationship.description}"
+
+
+def _get_documents(parser):
+    """
+    Get the search documents of the parsed objects: their fields, as lists of text segments,
+    and the platforms and tactics they are filtered by
+    """
+
+    documents = list()
+
+    def add(obj, obj_type, aliases, relationships, techniques, platforms=None, tactics=None):
+        if platforms is None:
+            platforms = { platform for technique in techniques for platform in technique.platforms }
+        if tactics is None:
+            tactics = { tactic.name for technique in techniques for tactic in technique.tactics }
+        documents.append({
+            'type': obj_type,
+            'id': getattr(obj, 'id', None),
+            'name': obj.name,
+            'platforms': sorted(platforms),
+            'tactics': sorted(tactics),
+            'fields': ([obj.name], aliases, [obj.description], relationships),
+        })
+
+    for tactic in parser.tactics:
+        add(tactic, 'tactic', [tactic.id], [], [], platforms=(), tactics=(tactic.name,))
+    for technique in parser.techniques:
+        relationships = [ _relationship_text(relationship, technique)
+                          for relationship in technique.mitigations + technique.groups + technique.software +
+                          technique.campaigns + technique.detections ]
+        add(technique, 'technique', [technique.id], relationships, [technique])
+    for mitigation in parser.mitigations:
+        add(mitigation, 'mitigation', [mitigation.id], [ _relationship_text(r, mitigation) for r in mitigation.mitigates ],
+            [ r.target for r in mitigation.mitigates ])
+    for group in parser.groups:
+        relationships = group.techniques_used + group.software_used + group.campaigns
+        add(group, 'group', [group.id] + group.aliases, [ _relationship_text(r, group) for r in relationships ],
+            [ r.target for r in group.techniques_used ])
+    for software in parser.software:
+        relationships = software.techniques_used + software.groups + software.campaigns
+        add(software, 'software', [software.id], [ _relationship_text(r, software) for r in relationships ],
+            [ r.target for r in software.techniques_used ])
+    for campaign in parser.campaigns:
+        relationships = campaign.groups + campaign.techniques_used + campaign.software_used
+        add(campaign, 'campaign', [campaign.id] + campaign.aliases, [ _relationship_text(r, campaign) for r in relationships ],
+            [ r.target for r in campaign.techniques_used ])
+    for datasource in parser.datasources:
+        relationships = list()
+        for component in datasource.components:
+            relationships.append(f"{component.name} {component.description}")
+            relationships += [ _relationship_text(r, component) for r in component.detects ]
+        add(datasource, 'datasource', [datasource.id], relationships,
+            [ r.target for component in datasource.components for r in component.detects ], platforms=datasource.platforms)
+    return documents
+
+
+class SearchIndex():
+    """
+    Inverted index of the names, aliases, descriptions and relationship descriptions of the parsed objects.
+    Each term maps to the positions where it occurs in each field of each document, so that phrases can be matched.
+    """
+
+    def __init__(self, documents, postings, lengths):
+        self.documents = documents
+        # term -> [[document, field, [positions]], ...]
+        self.postings = postings
+        # Number of terms of each field of each document
+        self.lengths = lengths
+        self._average_lengths = [ (sum(length[field] for length in lengths) / len(lengths)) if lengths else 0
+                                  for field in range(len(FIELDS)) ]
+
+    @classmethod
+    def build(cls, parser):
+        """
+        Build the index of the objects extracted by parser
+        """
+
+        documents = _get_documents(parser)
+        postings = dict()
+        lengths = list()
+        for doc_index, document in enumerate(documents):
+            fields = document.pop('fields')
+            length = list()
+            for field, segments in enumerate(fields):
+                field_postings = dict()
+                position = 0
+                for segment in segments:
+                    for token in tokenize(segment or ''):
+                        field_postings.setdefault(token, list()).append(position)
+                        position += 1
+                    # A phrase does not span two segments
+                    position += 1
+                for token, positions in field_postings.items():
+                    postings.setdefault(token, list()).append([doc_index, field, positions])
+                length.append(position)
+            lengths.append(length)
+        return cls(documents, postings, lengths)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as fd:
+            json.dump({
+                'version': INDEX_VERSION,
+                'documents': self.documents,
+                'lengths': self.lengths,
+                'postings': self.postings
+            }, fd, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a search index. Return None if the index is not usable.
+        """
+
+        try:
+            with open(path, 'r') as fd:
+                index = json.load(fd)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if index.get('version') != INDEX_VERSION:
+            return None
+        return cls(index['documents'], index['postings'], index['lengths'])
+
+    def _match(self, clause):
+        """
+        Get the occurrences of a term or a phrase: (document, field) -> count
+        """
+
+        matches = { (doc_index, field): positions for doc_index, field, positions in self.postings.get(clause[0], []) }
+        for offset, token in enumerate(clause[1:], 1):
+            next_matches = dict()
+            for doc_index, field, positions in self.postings.get(token, []):
+                starts = matches.get((doc_index, field))
+                if starts:
+                    following = set(positions)
+                    starts = [ start for start in starts if start + offset in following ]
+                    if starts:
+                        next_matches[(doc_index, field)] = starts
+            matches = next_matches
+            if not matches:
+                break
+        return { key: len(starts) for key, starts in matches.items() }
+
+    def search(self, query, types=None, platforms=None, tactics=None, limit=20):
+        """
+        Get the documents matching every term and phrase of the query, with the given types, platforms and tactics.
+        Return (score, document, matched fields) tuples, best first.
+        """
+
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+
+        types = { t.lower() for t in types } if types else None
+        platforms = { p.lower() for p in platforms } if platforms else None
+        tactics = { t.lower().replace('-', ' ') for t in tactics } if tactics else None
+
+        scores = None
+        matched_fields = dict()
+        for clause in clauses:
+            occurrences = self._match(clause)
+            documents = { doc_index for doc_index, _ in occurrences }
+            if not documents:
+                return []
+            idf = math.log(1 + (len(self.documents) - len(documents) + 0.5) / (len(documents) + 0.5))
+            clause_scores = dict()
+            for (doc_index, field), count in occurrences.items():
+                # Shorter fields weigh more, as in BM25
+                norm = 0.25 + 0.75 * self.lengths[doc_index][field] / (self._average_lengths[field] or 1)
+                clause_scores[doc_index] = clause_scores.get(doc_index, 0) + \
+                    FIELD_WEIGHTS[field] * count * (TF_SATURATION + 1) / (count + TF_SATURATION * norm)
+                matched_fields.setdefault(doc_index, set()).add(field)
+            if scores is None:
+                scores = { doc_index: idf * score for doc_index, score in clause_scores.items() }
+            else:
+                scores = { doc_index: scores[doc_index] + idf * score for doc_index, score in clause_scores.items() if doc_index in scores }
+
+        results = list()
+        for doc_index, score in scores.items():
+            document = self.documents[doc_index]
+            if types and document['type'] not in types:
+                continue
+            if platforms and platforms.isdisjoint(p.lower() for p in document['platforms']):
+                continue
+            if tactics and tactics.isdisjoint(t.lower() for t in document['tactics']):
+                continue
+            results.append((score, document, [ FIELDS[field] for field in sorted(matched_fields[doc_index]) ]))
+        results.sort(key=lambda result: (-result[0], result[1]['id'] or '', result[1]['name']))
+        return results[:limit] if limit else results
+
+
+def get_search_index(repo_url, domain, version=None, index_dir=None, **parser_options):
+    """
+    Get the search index of a STIX source, building it from the parsed objects only if it has not been saved yet
+    """
+
+    index_path = get_index_path(index_dir, repo_url, domain, version, 'search') if index_dir else None
+    if index_path:
+        index = SearchIndex.load(index_path)
+        if index:
+            logger.info(f"Loaded the search index {index_path}")
+            return index
+
+    # The STIX parser and its dependencies are slow to import
+    from .stix_parser import StixParser
+
+    parser = StixParser(repo_url, domain, version, **parser_options)
+    logger.info("Extracting objects from STIX data")
+    parser.get_data(tactics=True, techniques=True, mitigations=True, groups=True, software=True, campaigns=True, datasources=True)
+    logger.info("Building the search index")
+    index = SearchIndex.build(parser)
+    if index_path:
+        index.save(index_path)
+        logger.info(f"Search index saved in {index_path}")
+    return index
@@ -0,0 +1,155 @@
+from loguru import logger
+import hashlib
+import io
+import pickle
+import os
+
+from .models import MITREObject
+
+# Increase it whenever the models or the parser output change
+SNAPSHOT_VERSION = 7
+
+SNAPSHOT_LISTS = ('tactics', 'techniques', 'mitigations', 'groups', 'software', 'campaigns', 'datasources', 'datacomponents')
+
+
+def get_bundle_hash(path):
+    """
+    Compute the SHA-256 hash of a local STIX bundle
+    """
+
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(1 << 20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _get_state(obj):
+    """
+    Get the slot values of a model object
+    """
+
+    return { name: getattr(obj, name) for cls in type(obj).__mro__ for name in getattr(cls, '__slots__', ())
+             if hasattr(obj, name) }
+
+
+def get_snapshot_path(snapshot_dir, bundle_hash, stream=False):
+    return os.path.join(snapshot_dir, f"{bundle_hash[:32]}{'-stream' if stream else ''}.snapshot")
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """
+    Pickle the state of each model object on its own, storing the links to the other
+    objects as indexes. This keeps the pickling recursion flat on large graphs.
+    """
+
+    def __init__(self, fd, index):
+        pickle.Pickler.__init__(self, fd, protocol=pickle.HIGHEST_PROTOCOL)
+        self.index = index
+
+    def persistent_id(self, obj):
+        if isinstance(obj, MITREObject):
+            return self.index[id(obj)]
+        return None
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+
+    def __init__(self, fd, objects):
+        pickle.Unpickler.__init__(self, fd)
+        self.objects = objects
+
+    def persistent_load(self, pid):
+        return self.objects[pid]
+
+
+def _dump_objects(fd, bundle_hash, parser):
+    """
+    Write the parsed objects of parser, with their cross-links, to a binary file
+    """
+
+    objects = list()
+    lists = dict()
+    for list_name in SNAPSHOT_LISTS:
+        lists[list_name] = (len(objects), len(getattr(parser, list_name)))
+        objects += getattr(parser, list_name)
+    index = { id(obj): i for i, obj in enumerate(objects) }
+
+    pickler = _SnapshotPickler(fd, index)
+    pickler.dump({
+        'version': SNAPSHOT_VERSION,
+        'bundle_hash': bundle_hash,
+        'lists': lists,
+        'classes': [ type(obj) for obj in objects ]
+    })
+    for obj in objects:
+        pickler.dump(_get_state(obj))
+
+
+def _load_objects(fd, bundle_hash, parser):
+    """
+    Read the parsed objects written by _dump_objects into parser.
+    Return False if they have been written by another version or for another bundle.
+    """
+
+    unpickler = _SnapshotUnpickler(fd, None)
+    header = unpickler.load()
+    if header.get('version') != SNAPSHOT_VERSION or header.get('bundle_hash') != bundle_hash:
+        return False
+
+    objects = [ cls.__new__(cls) for cls in header['classes'] ]
+    unpickler.objects = objects
+    for obj in objects:
+        for name, value in unpickler.load().items():
+            setattr(obj, name, value)
+
+    for list_name, (start, length) in header['lists'].items():
+        setattr(parser, list_name, objects[start:start + length])
+    parser.objects = { obj.internal_id: obj for list_name in SNAPSHOT_LISTS if list_name != 'tactics' for obj in getattr(parser, list_name) }
+    return True
+
+
+def save_snapshot(path, bundle_hash, parser):
+    """
+    Save the parsed objects of parser, with their cross-links, to a snapshot file
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as fd:
+        _dump_objects(fd, bundle_hash, parser)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path, bundle_hash, parser):
+    """
+    Load the parsed objects from a snapshot file into parser.
+    Return False if the snapshot does not exist or it is not valid for the bundle.
+    """
+
+    if not os.path.isfile(path):
+        return False
+    try:
+        with open(path, 'rb') as fd:
+            return _load_objects(fd, bundle_hash, parser)
+    except Exception as e:
+        logger.warning(f"The snapshot {path} could not be loaded: {e}")
+        return False
+
+
+def dumps_objects(parser):
+    """
+    Serialize the parsed objects of parser, e.g. to send them back from a worker process
+    """
+
+    fd = io.BytesIO()
+    _dump_objects(fd, None, parser)
+    return fd.getvalue()
+
+
+def loads_objects(data, parser):
+    """
+    Load into parser the parsed objects serialized by dumps_objects
+    """
+
+    _load_objects(io.BytesIO(data), None, parser)
@@ -0,0 +1,135 @@
+from loguru import logger
+from .downloader import download, DownloadError
+from .snapshot import get_bundle_hash
+import hashlib
+import gzip
+import json
+import os
+
+CHUNK_SIZE = 1 << 16
+
+
+class StixCache():
+    """
+    Keep the downloaded STIX bundles in a local directory, compressed, along with
+    the ETag/Last-Modified headers used to revalidate them and the hashes used to verify them
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get_key(self, url, domain=None, version=None):
+        """
+        Get the cache key of a bundle: domain and version for the MITRE repository, a URL hash otherwise
+        """
+
+        if domain:
+            return f"{domain}-{version if version else 'latest'}"
+        return hashlib.sha256(url.encode()).hexdigest()[:16]
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def _read_metadata(self, key):
+        try:
+            with open(os.path.join(self.cache_dir, f"{key}.meta.json"), 'r') as fd:
+                return json.load(fd)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return dict()
+
+    def _write_metadata(self, key, metadata):
+        with open(os.path.join(self.cache_dir, f"{key}.meta.json"), 'w') as fd:
+            json.dump(metadata, fd, indent=2)
+
+    def _verify(self, key, path):
+        """
+        Check the cached bundle against the hash saved when it was downloaded. A corrupted bundle is removed.
+        """
+
+        expected_sha256 = self._read_metadata(key).get('file-sha256')
+        if expected_sha256 is None or get_bundle_hash(path) == expected_sha256:
+            return True
+        logger.warning(f"The cached STIX data {path} is corrupted and will be removed")
+        os.remove(path)
+        os.remove(os.path.join(self.cache_dir, f"{key}.meta.json"))
+        return False
+
+    def _get_sha256(self, key, path):
+        """
+        Get the hash of the uncompressed bundle, saved along with it by the recent versions of the cache
+        """
+
+        sha256 = self._read_metadata(key).get('sha256')
+        if sha256 is None:
+            digest = hashlib.sha256()
+            with gzip.open(path, 'rb') as fd:
+                for chunk in iter(lambda: fd.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+        return sha256
+
+    def fetch(self, url, key, pinned=False, offline=False, sha256=None):
+        """
+        Return the path of the cached bundle for url, downloading it if needed.
+        Pinned bundles are never revalidated. In offline mode the network is never used.
+        If sha256 is set, the bundle must have that hash.
+        """
+
+        path = self.get_path(key)
+        cached = os.path.isfile(path) and self._verify(key, path)
+        if cached and sha256 and self._get_sha256(key, path) != sha256.lower():
+            logger.warning(f"The cached STIX data {path} does not have the expected hash")
+            cached = False
+
+        if cached and (pinned or offline):
+            logger.info(f"Using cached STIX data {path}")
+            return path
+        if offline:
+            logger.critical(f"Offline mode: no cached STIX data for {key}")
+            exit(-1)
+
+        metadata = self._read_metadata(key) if cached else dict()
+        headers = dict()
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last-modified'):
+            headers['If-Modified-Since'] = metadata['last-modified']
+
+        # The partial download is kept in the cache, so that a later run can resume it
+        download_path = os.path.join(self.cache_dir, f"{key}.json")
+        try:
+            job = download(url, download_path, headers=headers, sha256=sha256)
+        except DownloadError as e:
+            if cached:
+                logger.warning(f"{e}. Using cached STIX data {path}")
+                return path
+            logger.critical(str(e))
+            exit(-1)
+        if job is None:
+            logger.info(f"Cached STIX data {path} is up to date")
+            return path
+
+        size = os.path.getsize(download_path)
+        sha256 = get_bundle_hash(download_path)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(download_path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=6) as fd:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    fd.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        os.remove(download_path)
+        self._write_metadata(key, {
+            'url': url,
+            'etag': job.response_headers.get('ETag'),
+            'last-modified': job.response_headers.get('Last-Modified'),
+            'size': size,
+            'sha256': sha256,
+            'file-sha256': get_bundle_hash(path)
+        })
+        logger.info(f"STIX data saved in cache {path}")
+        return path
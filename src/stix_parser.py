@@ -1,120 +1,392 @@
 from loguru import logger
 from tqdm import tqdm
-from stix2 import Filter
-from stix2 import MemoryStore
-import requests
+from urllib.parse import urlsplit
+import gzip
 import json
+import os
+import shutil
+import sys
+import tempfile
+import weakref
 
 from .models import (MITRETactic,
                      MITRETechnique,
                      MITREMitigation,
                      MITREGroup,
-                     MITRESoftware)
+                     MITRESoftware,
+                     MITRECampaign,
+                     MITREDataSource,
+                     MITREDataComponent,
+                     MITRERelationship)
+from .stix_store import StixStore, ValidatingStixStore
+from .stix_stream import iter_stix_objects, filter_stix_objects
+from .stix_cache import StixCache
+from .downloader import download, DownloadError
+from . import MITRE_REPO_URL
+from .snapshot import get_bundle_hash, get_snapshot_path, load_snapshot, save_snapshot
+from .profiler import profiler
+
+STREAM_CHUNK_SIZE = 1 << 16
+
+# Object types extracted by the parser, in linking order, with the types their relationships need
+EXTRACTION_STAGES = {
+    'tactics': (),
+    'techniques': ('tactics',),
+    'mitigations': ('techniques',),
+    'groups': ('techniques',),
+    'software': ('groups', 'techniques'),
+    'campaigns': ('groups', 'software', 'techniques'),
+    'datasources': ('techniques',),
+}
+
+# Relationship ends filled by the link stages, with the type of the objects holding them and the type they point to
+LINK_ENDS = {
+    'technique.tactics': ('techniques', 'tactics'),
+    'technique.subtechniques': ('techniques', 'techniques'),
+    'technique.mitigations': ('techniques', 'mitigations'),
+    'technique.groups': ('techniques', 'groups'),
+    'technique.software': ('techniques', 'software'),
+    'mitigation.mitigates': ('mitigations', 'techniques'),
+    'group.techniques_used': ('groups', 'techniques'),
+    'group.software_used': ('groups', 'software'),
+    'software.groups': ('software', 'groups'),
+    'software.techniques_used': ('software', 'techniques'),
+    'technique.campaigns': ('techniques', 'campaigns'),
+    'group.campaigns': ('groups', 'campaigns'),
+    'software.campaigns': ('software', 'campaigns'),
+    'campaign.groups': ('campaigns', 'groups'),
+    'campaign.techniques_used': ('campaigns', 'techniques'),
+    'campaign.software_used': ('campaigns', 'software'),
+    'technique.detections': ('techniques', 'datasources'),
+    'datasource.detects': ('datasources', 'techniques'),
+}
+
+# Relationship ends shown by the notes of each type. The references of an object gathered from
+# its relationships are only shown by its own notes, so they are collected along with its ends.
+NOTE_LINKS = {
+    'tactics': (),
+    'techniques': ('technique.tactics', 'technique.subtechniques', 'technique.mitigations', 'technique.groups', 'technique.software',
+                   'technique.campaigns', 'technique.detections'),
+    'mitigations': ('mitigation.mitigates',),
+    'groups': ('group.techniques_used', 'group.software_used', 'group.campaigns'),
+    'software': ('software.groups', 'software.techniques_used', 'software.campaigns'),
+    'campaigns': ('campaign.groups', 'campaign.techniques_used', 'campaign.software_used'),
+    'datasources': ('datasource.detects',),
+}
 
 class StixParser():
     """
     Get and parse STIX data creating Tactics and Techniques objects
     Get the ATT&CK STIX data from MITRE/CTI GitHub repository. 
     Domain should be 'enterprise-attack', 'mobile-attack', or 'ics-attack'. Branch should typically be master.
+    If validate is set, the STIX objects are loaded in a stix2 MemoryStore and validated.
+    If stream is set, the STIX bundle is decoded one object at a time and the deprecated and revoked objects are dropped.
+    The bundles are downloaded through a resumable download with retries (see downloader). If cache_dir is set, they are
+    cached there. In offline mode only cached or local bundles are used.
+    bundle_hashes maps the file names of the bundles to their expected SHA-256 hash.
+    If snapshot_dir is set, the parsed objects are saved there, keyed by the hash of the bundle, and reused by the next runs.
 
     """
 
-    def __init__(self, repo_url, domain, version=None):
-        mitre_repo_url = "https://raw.githubusercontent.com/mitre-attack/attack-stix-data/master"
-
-        if repo_url != mitre_repo_url:
+    def __init__(self, repo_url, domain, version=None, validate=False, stream=False, cache_dir=None, offline=False, snapshot_dir=None,
+                 bundle_hashes=None):
+        if repo_url != MITRE_REPO_URL:
             logger.warning("You have defined a different source for ATT&CK STIX data. The domain and version option will be ignored.")
-            if repo_url.startswith('http'):
-                response = requests.get(repo_url)
-                if response.status_code == 200:
-                    try:
-                        stix_json = response.json()
-                    except requests.JSONDecodeError:
-                        logger.critical(f"The STIX data at {repo_url} is not valid.")
-                        exit(-1)
-                else:
-                    logger.critical(f"An error while reaching the remote source: {response.status_code} - {response.reason}")
-                    exit(-1)
-            else:
-                try:
-                    with open(repo_url, 'r') as fd:
-                        stix_json = json.loads(fd.read())
-                except json.JSONDecodeError:
-                    logger.critical("You have provided an invalid JSON file")
-                    exit(-1)
-                except FileNotFoundError:
-                    logger.critical("The file defined in the config.yml does not exist")
-                    exit(-1)
+            source = repo_url
+        elif version:
+            logger.info(f"Downloading STIX data for domain {domain}, version {version}")
+            source = f"{repo_url}/{domain}/{domain}-{version}.json"
         else:
-            if version:
-                logger.info(f"Downloading STIX data for domain {domain}, version {version}")
-                response = requests.get(f"{repo_url}/{domain}/{domain}-{version}.json")
-                if response.status_code == 200:
-                    try:
-                        stix_json = response.json()
-                    except requests.JSONDecodeError:
-                        logger.critical(f"The STIX data at {repo_url} is not valid.")
-                        exit(-1)
-                else:
-                    logger.critical(f"An error while reaching the remote source: {response.status_code} - {response.reason}")
-                    exit(-1)
+            source = f"{repo_url}/{domain}/{domain}.json"
+
+        if source.startswith('http'):
+            sha256 = (bundle_hashes or {}).get(os.path.basename(urlsplit(source).path))
+            if cache_dir:
+                cache = StixCache(cache_dir)
+                with profiler.stage('download'):
+                    if repo_url == MITRE_REPO_URL:
+                        # Version-pinned bundles never change
+                        source = cache.fetch(source, cache.get_key(source, domain, version), pinned=bool(version), offline=offline,
+                                             sha256=sha256)
+                    else:
+                        source = cache.fetch(source, cache.get_key(source), offline=offline, sha256=sha256)
+            elif offline:
+                logger.critical("The offline mode requires a cache directory or a local STIX file")
+                exit(-1)
             else:
-                response = requests.get(f"{repo_url}/{domain}/{domain}.json")
-                if response.status_code == 200:
-                    try:
-                        stix_json = response.json()
-                    except requests.RequestsJSONDecodeError:
-                        logger.critical(f"The STIX data at {repo_url} is not valid.")
-                        exit(-1)
+                with profiler.stage('download'):
+                    source = self._download(source, sha256)
+
+        if stream and validate:
+            logger.warning("The STIX data validation needs the full STIX objects. The STIX data will not be streamed.")
+            stream = False
+
+        self._source = source
+        self._validate = validate
+        self._stream = stream
+        self.src = None
+        # Relationship ends filled by get_data. None for all of them
+        self._links = None
+        # Reference tuples shared by all the objects citing the same source
+        self._references = dict()
+
+        self.snapshot_path = None
+        if snapshot_dir and os.path.isfile(source):
+            self.bundle_hash = get_bundle_hash(source)
+            self.snapshot_path = get_snapshot_path(snapshot_dir, self.bundle_hash, stream)
+            if os.path.isfile(self.snapshot_path):
+                # The STIX data is loaded only if the snapshot cannot be used
+                return
+        self._load()
+
+    def _download(self, url, sha256=None):
+        """
+        Download a STIX bundle to a temporary file, removed along with the parser.
+        If sha256 is set, the bundle must have that hash.
+        """
+
+        tmp_dir = tempfile.mkdtemp(prefix='stix-')
+        weakref.finalize(self, shutil.rmtree, tmp_dir, ignore_errors=True)
+        path = os.path.join(tmp_dir, os.path.basename(urlsplit(url).path) or 'bundle.json')
+        try:
+            download(url, path, sha256=sha256)
+        except DownloadError as e:
+            logger.critical(str(e))
+            exit(-1)
+        return path
+
+    def _load(self):
+        """
+        Load the STIX data and index its relationships
+        """
+
+        if self._stream:
+            with profiler.stage('stream STIX data'):
+                self.src = self._stream_stix_data(self._source)
+        else:
+            with profiler.stage('load STIX data') as stage:
+                stix_objects = self._load_stix_data(self._source)
+                stage.items += len(stix_objects)
+            with profiler.stage('build store'):
+                if self._validate:
+                    self.src = ValidatingStixStore(stix_objects)
                 else:
-                    logger.critical(f"An error while reaching the remote source: {response.status_code} - {response.reason}")
-                    exit(-1)
+                    self.src = StixStore(stix_objects)
+        with profiler.stage('index relationships'):
+            self._build_relationship_index()
+
+    def _load_stix_data(self, source):
+        """
+        Load the whole STIX bundle from a local file and return its objects
+        """
+
+        try:
+            with self._open_local(source, 'r') as fd:
+                stix_json = json.loads(fd.read())
+        except (json.JSONDecodeError, gzip.BadGzipFile):
+            logger.critical("You have provided an invalid JSON file")
+            exit(-1)
+        except FileNotFoundError:
+            logger.critical("The file defined in the config.yml does not exist")
+            exit(-1)
         if not 'objects' in stix_json:
             logger.critical("The source provided does not contain a valid STIX bundle")
             exit(-1)
-        self.src = MemoryStore(stix_data=stix_json['objects'])
+        return stix_json['objects']
+
+    def _stream_stix_data(self, source):
+        """
+        Read the STIX objects from a local file one at a time, keeping only the objects
+        and the fields used by the parser
+        """
+
+        try:
+            with self._open_local(source, 'rb') as fd:
+                return StixStore(filter_stix_objects(iter_stix_objects(iter(lambda: fd.read(STREAM_CHUNK_SIZE), b''))))
+        except FileNotFoundError:
+            logger.critical("The file defined in the config.yml does not exist")
+            exit(-1)
+        except (ValueError, gzip.BadGzipFile):
+            logger.critical(f"The STIX data at {source} is not valid.")
+            exit(-1)
+
+    @staticmethod
+    def _open_local(path, mode):
+        """
+        Open a local STIX bundle, either plain or gzip-compressed
+        """
+
+        if path.endswith('.gz'):
+            return gzip.open(path, mode if mode.endswith('b') else f"{mode}t")
+        return open(path, mode)
+
+    def _build_relationship_index(self):
+        """
+        Index relationships by type and by source/target reference
+        """
 
+        self.relationships = dict()
+        self.reverse_relationships = dict()
+
+        for relationship in self.src.get('relationship'):
+            relationship_type = relationship['relationship_type']
+            self.relationships.setdefault(relationship_type, dict()).setdefault(relationship['source_ref'], list()).append(relationship)
+            self.reverse_relationships.setdefault(relationship_type, dict()).setdefault(relationship['target_ref'], list()).append(relationship)
+
+    def _get_relationships(self, relationship_type, source_ref=None, target_ref=None):
+        """
+        Get the relationships of the given type starting from source_ref or pointing to target_ref
+        """
+
+        if source_ref is not None:
+            return self.relationships.get(relationship_type, {}).get(source_ref, [])
+        return self.reverse_relationships.get(relationship_type, {}).get(target_ref, [])
+
+    def get_stix_objects(self, *types):
+        """
+        Get the STIX objects of the given types, loading the STIX data if a snapshot was used
+        """
+
+        if self.src is None:
+            self._load()
+        return self.src.get(*types)
+
+    def _intern_reference(self, reference):
+        """
+        Get the shared copy of a (source name, URL) reference
+        """
+
+        reference = (sys.intern(reference[0]), sys.intern(reference[1]))
+        return self._references.setdefault(reference, reference)
+
+    def _get_object(self, internal_id, object_type):
+        """
+        Get an already parsed object by its STIX id, if it has the expected type
+        """
+
+        obj = self.objects.get(internal_id)
+        if isinstance(obj, object_type):
+            return obj
+        return None
     
     def get_data(self, tactics=False,
                  techniques=False,
                  mitigations=False,
                  groups=False,
-                 software=False):
-        
+                 software=False,
+                 campaigns=False,
+                 datasources=False,
+                 links=None):
+        """
+        Extract the requested object types, along with the types they are linked to.
+        The objects of each type are built on their own, then linked together in a fixed order.
+        If links is set, only those relationship ends (see LINK_ENDS) are filled, and only the types they need are extracted.
+        """
+
+        # The snapshot holds the whole model graph
+        complete = links is None or set(links) >= set(LINK_ENDS)
+        if self.snapshot_path:
+            with profiler.stage('load snapshot'):
+                loaded = load_snapshot(self.snapshot_path, self.bundle_hash, self)
+            if loaded:
+                logger.info(f"Loaded the parsed objects from the snapshot {self.snapshot_path}")
+                return
+            if complete:
+                tactics = techniques = mitigations = groups = software = campaigns = datasources = True
+
+        if self.src is None:
+            self._load()
+
+        requested = { 'tactics': tactics, 'techniques': techniques, 'mitigations': mitigations, 'groups': groups, 'software': software,
+                      'campaigns': campaigns, 'datasources': datasources }
+        requested_types = [ object_type for object_type, wanted in requested.items() if wanted ]
+        if links is None:
+            object_types = self._plan_extraction(requested_types)
+        else:
+            linked_types = { object_type for end in links for object_type in LINK_ENDS[end] }
+            object_types = [ object_type for object_type in EXTRACTION_STAGES if object_type in requested_types or object_type in linked_types ]
+        self._links = None if links is None else set(links)
+
         self.tactics=list()
         self.techniques=list()
         self.mitigations=list()
         self.groups=list()
         self.software=list()
-        if tactics:
-            logger.info("Extracting Tactics...")
-            self._get_tactics()
-        if techniques:
-            logger.info("Extracting Techniques...")
-            self._get_techniques()
-        if mitigations:
-            logger.info("Extracting Mitigations...")
-            self._get_mitigations()
-        if groups:
-            logger.info("Extracting Groups...")
-            self._get_groups()
-        if software:
-            logger.info("Extracting Software...")
-            self._get_software()
-
-
-    def _get_tactics(self):
+        self.campaigns=list()
+        self.datasources=list()
+        self.datacomponents=list()
+        self.objects=dict()
+
+        logger.info(f"Extracting {', '.join(object_types)}...")
+        with profiler.stage('build objects') as stage:
+            built = { object_type: getattr(self, f"_build_{object_type}")() for object_type in object_types }
+            stage.items += sum(len(objects) for objects in built.values())
+
+        # Join: the links are made in the order of EXTRACTION_STAGES
+        for object_type in EXTRACTION_STAGES:
+            if object_type in built:
+                setattr(self, object_type, built[object_type])
+                if object_type != 'tactics':
+                    self.objects.update((obj.internal_id, obj) for obj in built[object_type])
+        # The data components are built along with their data source
+        self.datacomponents = [ component for datasource in self.datasources for component in datasource.components ]
+        self.objects.update((component.internal_id, component) for component in self.datacomponents)
+        for object_type in EXTRACTION_STAGES:
+            if object_type in built and object_type != 'tactics':
+                with profiler.stage(f"_link_{object_type}") as stage:
+                    getattr(self, f"_link_{object_type}")()
+                    stage.items += len(built[object_type])
+
+        if self.snapshot_path and complete:
+            with profiler.stage('save snapshot'):
+                save_snapshot(self.snapshot_path, self.bundle_hash, self)
+            logger.info(f"Parsed objects saved in the snapshot {self.snapshot_path}")
+        elif self.snapshot_path:
+            logger.info("Only a part of the relationships has been extracted: the snapshot is not saved")
+
+    @staticmethod
+    def get_note_links(note_types):
+        """
+        Get the relationship ends shown by the notes of the given types
+        """
+
+        return { end for note_type in note_types for end in NOTE_LINKS[note_type] }
+
+    def _has_link(self, end):
+        return self._links is None or end in self._links
+
+    @staticmethod
+    def _plan_extraction(object_types):
+        """
+        Add to the requested object types the ones they are linked to, in extraction order
+        """
+
+        planned = set()
+        pending = list(object_types)
+        while pending:
+            object_type = pending.pop()
+            if object_type not in planned:
+                planned.add(object_type)
+                pending += EXTRACTION_STAGES[object_type]
+
+        added = [ object_type for object_type in EXTRACTION_STAGES if object_type in planned and object_type not in object_types ]
+        if added:
+            logger.warning(f"Extracting {', '.join(added)} too: the requested objects are linked to them")
+        return [ object_type for object_type in EXTRACTION_STAGES if object_type in planned ]
+
+    def _build_tactics(self):
         """
         Get and parse tactics from STIX data
         """
 
         # Extract tactics
-        tactics_stix = self.src.query([ Filter('type', '=', 'x-mitre-tactic') ])
+        tactics_stix = self.src.get('x-mitre-tactic')
 
-        self.tactics = list()
+        tactics = list()
 
         for tactic in tqdm(tactics_stix):
             tactic_obj = MITRETactic(tactic['name'])
+            tactic_obj.internal_id = tactic['id']
             # Extract external references, including the link to mitre
             ext_refs = tactic.get('external_references', [])
 
@@ -122,24 +394,27 @@ class StixParser():
                 if ext_ref['source_name'] == 'mitre-attack':
                     tactic_obj.id = ext_ref['external_id']
                 
-                tactic_obj.references = (ext_ref['source_name'], ext_ref['url'])
+                tactic_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref['url']))
 
             tactic_obj.description = tactic['description']
+            if 'x_mitre_shortname' in tactic:
+                tactic_obj.shortname = tactic['x_mitre_shortname']
 
-            self.tactics.append(tactic_obj)
+            tactics.append(tactic_obj)
+        return tactics
 
-    def _get_techniques(self):
+    def _build_techniques(self):
         """
         Get and parse techniques from STIX data
         """
 
         # Extract techniques
-        tech_stix = self.src.query([ Filter('type', '=', 'attack-pattern') ])
+        tech_stix = self.src.get('attack-pattern')
 
-        self.techniques = list()
+        techniques = list()
 
         for tech in tqdm(tech_stix):
-            if ('x_mitre_deprecated' not in tech or not tech['x_mitre_deprecated']) and not tech['revoked']:
+            if ('x_mitre_deprecated' not in tech or not tech['x_mitre_deprecated']) and not tech.get('revoked', False):
                 technique_obj = MITRETechnique(tech['name'])
 
                 technique_obj.internal_id = tech['id']
@@ -151,7 +426,7 @@ class StixParser():
                     if ext_ref['source_name'] == 'mitre-attack':
                         technique_obj.id = ext_ref['external_id']
                         
-                    technique_obj.references = (ext_ref['source_name'], ext_ref.get('url',''))
+                    technique_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url','')))
 
                 kill_chain = tech.get('kill_chain_phases', [])
 
@@ -164,18 +439,28 @@ class StixParser():
                 technique_obj.permissions_required = tech.get('x_mitre_permissions_required', [])
                 technique_obj.description = tech['description']
 
-                self.techniques.append(technique_obj)
+                techniques.append(technique_obj)
+        return techniques
 
+    def _link_techniques(self):
+        """
+        Link techniques to their subtechniques and tactics
+        """
 
-    def _get_mitigations(self):
+        if self._has_link('technique.subtechniques'):
+            MITRETechnique.link_subtechniques(self.techniques)
+        if self._has_link('technique.tactics'):
+            self.tactics_by_phase = MITRETechnique.link_tactics(self.techniques, self.tactics)
+
+    def _build_mitigations(self):
         """
-        Get and parse techniques from STIX data
+        Get and parse mitigations from STIX data
         """
 
         # Extract mitigations
-        mitigations_stix = self.src.query([ Filter('type', '=', 'course-of-action') ])
+        mitigations_stix = self.src.get('course-of-action')
 
-        self.mitigations = list()
+        mitigations = list()
 
         for mitigation in tqdm(mitigations_stix):
             if not mitigation.get('x_mitre_deprecated', False): 
@@ -189,31 +474,55 @@ class StixParser():
                 for ext_ref in ext_refs:
                     if ext_ref['source_name'] == 'mitre-attack':
                         mitigation_obj.id = ext_ref['external_id']
-                    mitigation_obj.references = (ext_ref['source_name'], ext_ref.get('url',''))
-                        
-                mitigation_relationships = self.src.query([ Filter('type', '=', 'relationship'), Filter('relationship_type', '=', 'mitigates'), Filter('source_ref', '=', mitigation_obj.internal_id) ])
+                    mitigation_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url','')))
 
-                for relationship in mitigation_relationships:
-                    for technique in self.techniques:
-                        refs = relationship.get('external_references', [])
-                        for ext_ref in refs:
-                            mitigation_obj.references = (ext_ref['source_name'], ext_ref.get('url',''))
-                            technique.references = (ext_ref['source_name'], ext_ref.get('url',''))
-                        if technique.internal_id == relationship['target_ref']:
-                            mitigation_obj.mitigates = {'technique': technique, 'description': relationship.get('description', '') }
-                            technique.mitigations = {'mitigation': mitigation_obj, 'description': relationship.get('description', '') }
+                mitigations.append(mitigation_obj)
+        return mitigations
 
-                self.mitigations.append(mitigation_obj)
+    def _link_mitigations(self):
+        """
+        Link mitigations to the techniques they mitigate
+        """
 
-    def _get_groups(self):
+        mitigates = self._has_link('mitigation.mitigates')
+        mitigated_by = self._has_link('technique.mitigations')
+        if not mitigates and not mitigated_by:
+            return
+        relationships_refs = dict()
+
+        for mitigation_obj in self.mitigations:
+            for relationship in self._get_relationships('mitigates', source_ref=mitigation_obj.internal_id):
+                refs = relationship.get('external_references', [])
+                if self.techniques:
+                    for ext_ref in refs:
+                        if mitigates:
+                            mitigation_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url','')))
+                        relationships_refs[self._intern_reference((ext_ref['source_name'], ext_ref.get('url','')))] = None
+                technique = self._get_object(relationship['target_ref'], MITRETechnique)
+                if technique:
+                    mitigation_relationship = MITRERelationship(mitigation_obj, technique, relationship.get('description', ''))
+                    if mitigates:
+                        mitigation_obj.mitigates = mitigation_relationship
+                    if mitigated_by:
+                        technique.mitigations = mitigation_relationship
+
+        if not mitigated_by:
+            return
+
+        # The references of the mitigation relationships are listed in every technique note
+        for technique in self.techniques:
+            for ref in relationships_refs:
+                technique.references = ref
+
+    def _build_groups(self):
         """
         Get and parse groups from STIX data
         """
 
         # Extract groups
-        groups_stix = self.src.query([ Filter('type', '=', 'intrusion-set') ])
+        groups_stix = self.src.get('intrusion-set')
 
-        self.groups = list()
+        groups = list()
 
         for group in tqdm(groups_stix):
             if group.get('x_mitre_deprecated', False) != 'true':
@@ -228,33 +537,49 @@ class StixParser():
                     if ext_ref['source_name'] == 'mitre-attack':
                         group_obj.id = ext_ref['external_id']
                         
-                    group_obj.references = (ext_ref['source_name'], ext_ref.get('url', ''))
-
-                group_relationships = self.src.query([ Filter('type', '=', 'relationship'), Filter('relationship_type', '=', 'uses'), Filter('source_ref', '=', group_obj.internal_id) ])
-
-                for relationship in group_relationships:
-                    for technique in self.techniques:
-                        if technique.internal_id == relationship['target_ref']:
-                            refs = relationship.get('external_references', [])
-                            for ext_ref in refs:
-                                group_obj.references = (ext_ref['source_name'], ext_ref['url'])
-                                technique.references = (ext_ref['source_name'], ext_ref['url'])
-                            group_obj.techniques_used = {'technique': technique, 'description': relationship.get('description', '') }
-                            technique.groups = {'group': group_obj, 'description': relationship.get('description', '') }
+                    group_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url', '')))
+
                 group_obj.aliases = group.get('aliases', [])
                 group_obj.description = group.get('description', '')
 
-                self.groups.append(group_obj)
+                groups.append(group_obj)
+        return groups
+
+    def _link_groups(self):
+        """
+        Link groups to the techniques they use
+        """
 
-    def _get_software(self):
+        uses = self._has_link('group.techniques_used')
+        used_by = self._has_link('technique.groups')
+        if not uses and not used_by:
+            return
+
+        for group_obj in self.groups:
+            for relationship in self._get_relationships('uses', source_ref=group_obj.internal_id):
+                technique = self._get_object(relationship['target_ref'], MITRETechnique)
+                if technique:
+                    refs = relationship.get('external_references', [])
+                    for ext_ref in refs:
+                        if uses:
+                            group_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref['url']))
+                        if used_by:
+                            technique.references = self._intern_reference((ext_ref['source_name'], ext_ref['url']))
+                    group_relationship = MITRERelationship(group_obj, technique, relationship.get('description', ''))
+                    if uses:
+                        group_obj.techniques_used = group_relationship
+                    if used_by:
+                        technique.groups = group_relationship
+
+    def _build_software(self):
         """
         Get and parse software objects from STIX data
         """
 
         # Extract software (tools, malware)
-        software_stix = self.src.query([ Filter('type', '=', 'tool') ]) + self.src.query([ Filter('type', '=', 'malware') ])
+        software_stix = self.src.get('tool', 'malware')
 
-        self.software = list()
+        software = list()
 
         for sw in tqdm(software_stix):
             if 'x_mitre_deprecated' not in sw or not sw['x_mitre_deprecated']:
@@ -269,29 +594,202 @@ class StixParser():
                     if ext_ref['source_name'] == 'mitre-attack':
                         software_obj.id = ext_ref['external_id']
                         
-                    software_obj.references = (ext_ref['source_name'], ext_ref.get('url', ''))
-
-                group_relationships = self.src.query([ Filter('type', '=', 'relationship'), Filter('relationship_type', '=', 'uses'), Filter('target_ref', '=', software_obj.internal_id) ])
-                for relationship in group_relationships:
-                    for group in self.groups:
-                        if group.internal_id == relationship['source_ref']:
-                            refs = relationship.get('external_references', [])
-                            for ext_ref in refs:
-                                software_obj.references = (ext_ref['source_name'], ext_ref['url'])
-                                group.references = (ext_ref['source_name'], ext_ref['url'])
-                            group.software_used = {'software': software_obj, 'description': relationship.get('description', '')}
-                            software_obj.groups = {'group': group, 'description': relationship.get('description', '')}
-
-                techniques_relationships = self.src.query([ Filter('type', '=', 'relationship'), Filter('relationship_type', '=', 'uses'), Filter('source_ref', '=', software_obj.internal_id) ])
-                for relationship in techniques_relationships:
-                    for technique in self.techniques:
-                        if technique.internal_id == relationship['target_ref']:
-                            refs = relationship.get('external_references', [])
-                            for ext_ref in refs:
-                                software_obj.references = (ext_ref['source_name'], ext_ref['url'])
-                                technique.references = (ext_ref['source_name'], ext_ref['url'])
-                            software_obj.techniques_used = {'technique': technique, 'description': relationship.get('description', '')}
-                            technique.software = {'software': software_obj, 'description': relationship.get('description', '')}
+                    software_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url', '')))
 
                 software_obj.description = sw['description']
-                self.software.append(software_obj)
+                software.append(software_obj)
+        return software
+
+    def _link_software(self):
+        """
+        Link software to the groups using it and to the techniques it uses
+        """
+
+        used_by_groups = self._has_link('software.groups')
+        group_uses = self._has_link('group.software_used')
+        uses = self._has_link('software.techniques_used')
+        used_by = self._has_link('technique.software')
+
+        for software_obj in self.software:
+            if used_by_groups or group_uses:
+                for relationship in self._get_relationships('uses', target_ref=software_obj.internal_id):
+                    group = self._get_object(relationship['source_ref'], MITREGroup)
+                    if group:
+                        refs = relationship.get('external_references', [])
+                        for ext_ref in refs:
+                            if used_by_groups:
+                                software_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref['url']))
+                            if group_uses:
+                                group.references = self._intern_reference((ext_ref['source_name'], ext_ref['url']))
+                        group_relationship = MITRERelationship(group, software_obj, relationship.get('description', ''))
+                        if group_uses:
+                            group.software_used = group_relationship
+                        if used_by_groups:
+                            software_obj.groups = group_relationship
+
+            if uses or used_by:
+                for relationship in self._get_relationships('uses', source_ref=software_obj.internal_id):
+                    technique = self._get_object(relationship['target_ref'], MITRETechnique)
+                    if technique:
+                        refs = relationship.get('external_references', [])
+                        for ext_ref in refs:
+                            if uses:
+                                software_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref['url']))
+                            if used_by:
+                                technique.references = self._intern_reference((ext_ref['source_name'], ext_ref['url']))
+                        technique_relationship = MITRERelationship(software_obj, technique, relationship.get('description', ''))
+                        if uses:
+                            software_obj.techniques_used = technique_relationship
+                        if used_by:
+                            technique.software = technique_relationship
+
+    def _build_campaigns(self):
+        """
+        Get and parse campaigns from STIX data
+        """
+
+        # Extract campaigns
+        campaigns_stix = self.src.get('campaign')
+
+        campaigns = list()
+
+        for campaign in tqdm(campaigns_stix):
+            if not campaign.get('x_mitre_deprecated', False) and not campaign.get('revoked', False):
+                campaign_obj = MITRECampaign(campaign['name'])
+
+                campaign_obj.internal_id = campaign['id']
+
+                # Extract external references, including the link to mitre
+                ext_refs = campaign.get('external_references', [])
+
+                for ext_ref in ext_refs:
+                    if ext_ref['source_name'] == 'mitre-attack':
+                        campaign_obj.id = ext_ref['external_id']
+
+                    campaign_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url', '')))
+
+                campaign_obj.aliases = campaign.get('aliases', [])
+                # Dates only: the timestamps are not significant
+                campaign_obj.first_seen = str(campaign.get('first_seen', ''))[:10]
+                campaign_obj.last_seen = str(campaign.get('last_seen', ''))[:10]
+                campaign_obj.description = campaign.get('description', '')
+
+                campaigns.append(campaign_obj)
+        return campaigns
+
+    def _link_campaigns(self):
+        """
+        Link campaigns to the groups they are attributed to and to the techniques and software they use
+        """
+
+        ends = { end: self._has_link(end) for end in ('campaign.groups', 'group.campaigns',
+                                                      'campaign.techniques_used', 'technique.campaigns',
+                                                      'campaign.software_used', 'software.campaigns') }
+
+        for campaign_obj in self.campaigns:
+            if ends['campaign.groups'] or ends['group.campaigns']:
+                for relationship in self._get_relationships('attributed-to', source_ref=campaign_obj.internal_id):
+                    group = self._get_object(relationship['target_ref'], MITREGroup)
+                    if group:
+                        self._link_campaign(campaign_obj, group, relationship, ends['campaign.groups'], ends['group.campaigns'])
+
+            for relationship in self._get_relationships('uses', source_ref=campaign_obj.internal_id):
+                target = self.objects.get(relationship['target_ref'])
+                if isinstance(target, MITRETechnique):
+                    self._link_campaign(campaign_obj, target, relationship, ends['campaign.techniques_used'], ends['technique.campaigns'])
+                elif isinstance(target, MITRESoftware):
+                    self._link_campaign(campaign_obj, target, relationship, ends['campaign.software_used'], ends['software.campaigns'])
+
+    @staticmethod
+    def _link_campaign(campaign_obj, target, relationship, forward, backward):
+        """
+        Link a campaign to a group, technique or software, filling the requested ends of the relationship
+        """
+
+        if not forward and not backward:
+            return
+        for ext_ref in relationship.get('external_references', []):
+            if forward:
+                campaign_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url', '')))
+            if backward:
+                target.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url', '')))
+        campaign_relationship = MITRERelationship(campaign_obj, target, relationship.get('description', ''))
+        if forward:
+            if isinstance(target, MITREGroup):
+                campaign_obj.groups = campaign_relationship
+            elif isinstance(target, MITRETechnique):
+                campaign_obj.techniques_used = campaign_relationship
+            else:
+                campaign_obj.software_used = campaign_relationship
+        if backward:
+            target.campaigns = campaign_relationship
+
+    def _build_datasources(self):
+        """
+        Get and parse data sources from STIX data, along with their data components
+        """
+
+        # Extract data sources and data components
+        datasources_stix = self.src.get('x-mitre-data-source')
+        components_stix = self.src.get('x-mitre-data-component')
+
+        datasources = list()
+        datasources_by_id = dict()
+
+        for datasource in tqdm(datasources_stix):
+            if not datasource.get('x_mitre_deprecated', False) and not datasource.get('revoked', False):
+                datasource_obj = MITREDataSource(datasource['name'])
+
+                datasource_obj.internal_id = datasource['id']
+
+                # Extract external references, including the link to mitre
+                ext_refs = datasource.get('external_references', [])
+
+                for ext_ref in ext_refs:
+                    if ext_ref['source_name'] == 'mitre-attack':
+                        datasource_obj.id = ext_ref['external_id']
+
+                    datasource_obj.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url', '')))
+
+                datasource_obj.platforms = datasource.get('x_mitre_platforms', [])
+                datasource_obj.collection_layers = datasource.get('x_mitre_collection_layers', [])
+                datasource_obj.description = datasource.get('description', '')
+
+                datasources.append(datasource_obj)
+                datasources_by_id[datasource_obj.internal_id] = datasource_obj
+
+        for component in components_stix:
+            if not component.get('x_mitre_deprecated', False) and not component.get('revoked', False):
+                datasource_obj = datasources_by_id.get(component.get('x_mitre_data_source_ref'))
+                if datasource_obj:
+                    component_obj = MITREDataComponent(component['name'])
+                    component_obj.internal_id = component['id']
+                    component_obj.description = component.get('description', '')
+                    component_obj.datasource = datasource_obj
+                    datasource_obj.components = component_obj
+        return datasources
+
+    def _link_datasources(self):
+        """
+        Link the data components to the techniques they detect
+        """
+
+        detects = self._has_link('datasource.detects')
+        detected_by = self._has_link('technique.detections')
+        if not detects and not detected_by:
+            return
+
+        for component_obj in self.datacomponents:
+            for relationship in self._get_relationships('detects', source_ref=component_obj.internal_id):
+                technique = self._get_object(relationship['target_ref'], MITRETechnique)
+                if technique:
+                    for ext_ref in relationship.get('external_references', []):
+                        if detects:
+                            component_obj.datasource.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url', '')))
+                        if detected_by:
+                            technique.references = self._intern_reference((ext_ref['source_name'], ext_ref.get('url', '')))
+                    detection_relationship = MITRERelationship(component_obj, technique, relationship.get('description', ''))
+                    if detects:
+                        component_obj.detects = detection_relationship
+                    if detected_by:
+                        technique.detections = detection_relationship
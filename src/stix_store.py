@@ -0,0 +1,33 @@
+class StixStore():
+    """
+    Keep the STIX objects of a bundle as plain dicts, partitioned by type.
+    The objects are not validated: use ValidatingStixStore for that.
+    """
+
+    def __init__(self, stix_objects):
+        self._objects = dict()
+        for stix_object in stix_objects:
+            self._objects.setdefault(stix_object['type'], list()).append(stix_object)
+
+    def get(self, *stix_types):
+        """
+        Get all the objects of the given types, in bundle order within each type
+        """
+
+        objects = list()
+        for stix_type in stix_types:
+            objects += self._objects.get(stix_type, [])
+        return objects
+
+
+class ValidatingStixStore(StixStore):
+    """
+    Load the STIX objects in a stix2 MemoryStore, validating each one of them.
+    The validated objects are then partitioned by type with a single scan of the store.
+    """
+
+    def __init__(self, stix_objects):
+        # stix2 is slow to import and only needed when validating
+        from stix2 import MemoryStore
+
+        StixStore.__init__(self, MemoryStore(stix_data=stix_objects).query())
@@ -0,0 +1,147 @@
+import codecs
+import json
+
+# Fields of each STIX type read by the parser and the version diff. Objects of other types are dropped.
+STIX_FIELDS = {
+    'x-mitre-tactic': ('modified', 'x_mitre_version', 'name', 'description', 'external_references', 'x_mitre_shortname'),
+    'attack-pattern': ('modified', 'x_mitre_version', 'name', 'description', 'external_references', 'kill_chain_phases',
+                       'x_mitre_is_subtechnique', 'x_mitre_platforms', 'x_mitre_permissions_required'),
+    'course-of-action': ('modified', 'x_mitre_version', 'name', 'description', 'external_references'),
+    'intrusion-set': ('modified', 'x_mitre_version', 'name', 'description', 'external_references', 'aliases'),
+    'tool': ('modified', 'x_mitre_version', 'name', 'description', 'external_references'),
+    'malware': ('modified', 'x_mitre_version', 'name', 'description', 'external_references'),
+    'campaign': ('modified', 'x_mitre_version', 'name', 'description', 'external_references', 'aliases', 'first_seen', 'last_seen'),
+    'x-mitre-data-source': ('modified', 'x_mitre_version', 'name', 'description', 'external_references', 'x_mitre_platforms',
+                            'x_mitre_collection_layers'),
+    'x-mitre-data-component': ('modified', 'x_mitre_version', 'name', 'description', 'x_mitre_data_source_ref'),
+    'relationship': ('modified', 'relationship_type', 'source_ref', 'target_ref', 'description', 'external_references'),
+}
+
+EXTERNAL_REFERENCE_FIELDS = ('source_name', 'url', 'external_id')
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+
+class _Buffer():
+    """
+    Text buffer filled on demand from an iterable of bytes or str chunks
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Read the next chunk, dropping the already consumed text. Return False at the end of the data
+        """
+
+        if self.eof:
+            return False
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.eof = True
+            self.text += self._decoder.decode(b'', final=True)
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+        self.text += chunk
+        return True
+
+    def peek(self):
+        """
+        Skip the whitespaces and return the next character, or an empty string at the end of the data
+        """
+
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at the STIX bundle position {self.pos}")
+        self.pos += 1
+
+    def decode(self):
+        """
+        Decode the next JSON value, reading more chunks until it is complete
+        """
+
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_stix_objects(chunks):
+    """
+    Yield the entries of the 'objects' array of a STIX bundle, decoding one object at a time
+    from an iterable of bytes or str chunks. The other members of the bundle are skipped.
+    """
+
+    buffer = _Buffer(chunks)
+    buffer.expect('{')
+    found = False
+    first = True
+    while buffer.peek() != '}':
+        if not first:
+            buffer.expect(',')
+        first = False
+        key = buffer.decode()
+        buffer.expect(':')
+        if key == 'objects':
+            buffer.expect('[')
+            first_object = True
+            while buffer.peek() != ']':
+                if not first_object:
+                    buffer.expect(',')
+                first_object = False
+                yield buffer.decode()
+            buffer.expect(']')
+            found = True
+        else:
+            buffer.decode()
+    if not found:
+        raise ValueError("The STIX bundle does not contain any object")
+
+
+def filter_stix_objects(stix_objects):
+    """
+    Drop the deprecated and revoked objects and the types not used by the parser,
+    keeping only the fields the parser reads
+    """
+
+    for stix_object in stix_objects:
+        fields = STIX_FIELDS.get(stix_object.get('type'))
+        if fields is None:
+            continue
+        if stix_object.get('x_mitre_deprecated', False) or stix_object.get('revoked', False):
+            continue
+
+        filtered = {'type': stix_object['type'], 'id': stix_object['id']}
+        for field in fields:
+            if field in stix_object:
+                filtered[field] = stix_object[field]
+        if 'external_references' in filtered:
+            filtered['external_references'] = [{key: ext_ref[key] for key in EXTERNAL_REFERENCE_FIELDS if key in ext_ref}
+                                               for ext_ref in filtered['external_references']]
+        yield filtered
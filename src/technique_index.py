@@ -0,0 +1,108 @@
+from loguru import logger
+from . import MITRE_REPO_URL
+from .models import MITRETactic, MITRETechnique
+
+import hashlib
+import json
+import os
+
+# Increase it whenever the index content changes
+INDEX_VERSION = 3
+
+
+def get_index_path(index_dir, repo_url, domain, version=None, kind='index'):
+    """
+    Get the path of an index (the technique index by default) of a STIX source.
+    Return None if the source may change without notice (e.g. the latest ATT&CK version).
+    """
+
+    if repo_url == MITRE_REPO_URL:
+        if not version:
+            return None
+        key = f"{domain}-{version}"
+    elif os.path.isfile(repo_url):
+        stat = os.stat(repo_url)
+        key = hashlib.sha256(f"{os.path.abspath(repo_url)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+    else:
+        return None
+    return os.path.join(index_dir, f"{key}.{kind}.json")
+
+
+def save_technique_index(path, tactics, techniques):
+    """
+    Save the fields of tactics and techniques needed to link notes and draw the matrix
+    """
+
+    index = {
+        'version': INDEX_VERSION,
+        'tactics': [ {'id': t.id, 'internal_id': t.internal_id, 'name': t.name, 'shortname': t.shortname} for t in tactics ],
+        'techniques': [ {'id': t.id,
+                         'internal_id': t.internal_id,
+                         'name': t.name,
+                         'is_subtechnique': t.is_subtechnique,
+                         'kill_chain_phases': [ {'kill_chain_name': k['kill_chain_name'], 'phase_name': k['phase_name']}
+                                                for k in t.kill_chain_phases ]} for t in techniques ]
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as fd:
+        json.dump(index, fd, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def load_technique_index(path):
+    """
+    Load tactics and techniques from a technique index. Return None if the index is not usable.
+    """
+
+    try:
+        with open(path, 'r') as fd:
+            index = json.load(fd)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if index.get('version') != INDEX_VERSION:
+        return None
+
+    tactics = list()
+    for entry in index['tactics']:
+        tactic = MITRETactic(entry['name'])
+        tactic.id = entry['id']
+        tactic.internal_id = entry['internal_id']
+        tactic.shortname = entry['shortname']
+        tactics.append(tactic)
+
+    techniques = list()
+    for entry in index['techniques']:
+        technique = MITRETechnique(entry['name'])
+        technique.id = entry['id']
+        technique.internal_id = entry['internal_id']
+        technique.is_subtechnique = entry['is_subtechnique']
+        for kill_chain_phase in entry['kill_chain_phases']:
+            technique.kill_chain_phases = kill_chain_phase
+        techniques.append(technique)
+    MITRETechnique.link_subtechniques(techniques)
+    MITRETechnique.link_tactics(techniques, tactics)
+    return tactics, techniques
+
+
+def get_tactics_and_techniques(repo_url, domain, version=None, index_dir=None, **parser_options):
+    """
+    Get tactics and techniques from the technique index, parsing the STIX data only if the index is missing
+    """
+
+    index_path = get_index_path(index_dir, repo_url, domain, version) if index_dir else None
+    if index_path:
+        index = load_technique_index(index_path)
+        if index:
+            logger.info(f"Loaded tactics and techniques from the index {index_path}")
+            return index
+
+    # The STIX parser and its dependencies are slow to import
+    from .stix_parser import StixParser
+
+    parser = StixParser(repo_url, domain, version, **parser_options)
+    logger.info("Extracting objects from STIX data")
+    parser.get_data(tactics=True, techniques=True)
+    if index_path:
+        save_technique_index(index_path, parser.tactics, parser.techniques)
+    return parser.tactics, parser.techniques
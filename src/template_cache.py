@@ -0,0 +1,22 @@
+from jinja2 import FileSystemBytecodeCache
+from jinja2.bccache import Bucket
+
+import os
+
+
+class TemplateCache(FileSystemBytecodeCache):
+    """
+    Keep the compiled templates in a directory, keyed by the hash of their source, so that they
+    are compiled once and reused by the next runs and by the worker processes. The entries of
+    another Python or Jinja version are compiled again.
+    """
+
+    def __init__(self, cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+        FileSystemBytecodeCache.__init__(self, cache_dir, '%s.jinja.cache')
+
+    def get_bucket(self, environment, name, filename, source):
+        checksum = self.get_source_checksum(source)
+        bucket = Bucket(environment, checksum, checksum)
+        self.load_bytecode(bucket)
+        return bucket
@@ -0,0 +1,171 @@
+from .models import MITREObject
+
+# Types of the compared STIX objects and the changelog section they are listed in
+DIFF_TYPES = {
+    'x-mitre-tactic': 'Tactics',
+    'attack-pattern': 'Techniques',
+    'course-of-action': 'Mitigations',
+    'intrusion-set': 'Groups',
+    'tool': 'Software',
+    'malware': 'Software',
+    'campaign': 'Campaigns',
+    'x-mitre-data-source': 'Data Sources',
+    'x-mitre-data-component': 'Data Components',
+}
+
+
+def _is_active(stix_object):
+    return not stix_object.get('x_mitre_deprecated', False) and not stix_object.get('revoked', False)
+
+
+def _get_records(parser):
+    """
+    Get the version records of the objects and of the relationships of a parsed bundle, by STIX id
+    """
+
+    objects = dict()
+    for stix_object in parser.get_stix_objects(*DIFF_TYPES):
+        attack_id = None
+        for ext_ref in stix_object.get('external_references', []):
+            if ext_ref.get('source_name') == 'mitre-attack':
+                attack_id = ext_ref.get('external_id')
+        objects[stix_object['id']] = {
+            'type': stix_object['type'],
+            'name': MITREObject(stix_object['name']).name,
+            'attack_id': attack_id,
+            'shortname': stix_object.get('x_mitre_shortname'),
+            'is_subtechnique': stix_object.get('x_mitre_is_subtechnique', False),
+            'datasource': stix_object.get('x_mitre_data_source_ref'),
+            'version': (str(stix_object.get('modified')), stix_object.get('x_mitre_version'), _is_active(stix_object)),
+        }
+
+    relationships = dict()
+    for relationship in parser.get_stix_objects('relationship'):
+        relationships[relationship['id']] = (relationship['relationship_type'],
+                                             relationship['source_ref'],
+                                             relationship['target_ref'],
+                                             (str(relationship.get('modified')), _is_active(relationship)))
+    return objects, relationships
+
+
+class VersionDiff():
+    """
+    Compare the STIX objects of two ATT&CK versions by their id, modified timestamp and x_mitre_version,
+    along with their relationships. Deprecated and revoked objects are considered removed.
+    """
+
+    def __init__(self, old_parser, new_parser):
+        old_objects, old_relationships = _get_records(old_parser)
+        new_objects, new_relationships = _get_records(new_parser)
+
+        self.added = list()
+        self.removed = list()
+        self.changed = list()
+        # STIX ids of the objects whose version record differs
+        self.changed_ids = set()
+        # STIX ids of the objects whose name, ATT&CK id or existence has changed, which are shown in the notes of their neighbours
+        self.renamed_ids = set()
+        for internal_id in old_objects.keys() | new_objects.keys():
+            old = old_objects.get(internal_id)
+            new = new_objects.get(internal_id)
+            if old and new and old['version'] == new['version']:
+                continue
+            self.changed_ids.add(internal_id)
+            old_active = bool(old) and old['version'][2]
+            new_active = bool(new) and new['version'][2]
+            if new_active and not old_active:
+                self.added.append((internal_id, new))
+            elif old_active and not new_active:
+                self.removed.append((internal_id, old))
+            elif old_active and new_active:
+                self.changed.append((internal_id, old, new))
+                if old['name'] == new['name'] and old['attack_id'] == new['attack_id']:
+                    continue
+            self.renamed_ids.add(internal_id)
+        self._renamed_records = [ record for internal_id in self.renamed_ids
+                                  for record in (old_objects.get(internal_id), new_objects.get(internal_id)) if record ]
+        # Data components of each data source: they are shown in its note
+        self._components = dict()
+        for objects in (old_objects, new_objects):
+            for internal_id, record in objects.items():
+                if record['datasource']:
+                    self._components.setdefault(record['datasource'], set()).add(internal_id)
+
+        self.changed_relationships = list()
+        self._neighbours = dict()
+        for relationships in (old_relationships, new_relationships):
+            for relationship_type, source_ref, target_ref, _ in relationships.values():
+                self._neighbours.setdefault(source_ref, set()).add(target_ref)
+                self._neighbours.setdefault(target_ref, set()).add(source_ref)
+        for relationship_id in old_relationships.keys() | new_relationships.keys():
+            old = old_relationships.get(relationship_id)
+            new = new_relationships.get(relationship_id)
+            if old and new and old[3] == new[3]:
+                continue
+            for relationship in (old, new):
+                if relationship:
+                    self.changed_relationships.append(relationship[:3])
+
+    def get_affected(self, techniques):
+        """
+        Get the STIX ids of the objects whose notes must be generated again: the changed objects, the ends of the
+        changed relationships and the neighbours of the renamed, added or removed objects. Technique notes also show
+        the names of their tactics and subtechniques, the references of every mitigation relationship and the data
+        sources of their detections. Data source notes show their data components.
+        """
+
+        affected = set(self.changed_ids)
+        for internal_id in self.renamed_ids:
+            affected |= self._neighbours.get(internal_id, set())
+            # The techniques detected by the components of a renamed data source
+            for component_id in self._components.get(internal_id, ()):
+                affected |= self._neighbours.get(component_id, set())
+
+        all_techniques = False
+        for relationship_type, source_ref, target_ref in self.changed_relationships:
+            affected.add(source_ref)
+            affected.add(target_ref)
+            if relationship_type == 'mitigates':
+                all_techniques = True
+
+        changed_phases = set()
+        parent_ids = set()
+        for record in self._renamed_records:
+            if record['type'] == 'x-mitre-tactic' and record['shortname']:
+                changed_phases.add(record['shortname'])
+            elif record['type'] == 'course-of-action':
+                all_techniques = True
+            elif record['type'] == 'attack-pattern' and record['is_subtechnique'] and record['attack_id']:
+                parent_ids.add(record['attack_id'].split('.')[0])
+
+        # The data source of an affected data component
+        for internal_id, component_ids in self._components.items():
+            if not affected.isdisjoint(component_ids):
+                affected.add(internal_id)
+
+        for technique in techniques:
+            if all_techniques or technique.id in parent_ids or \
+                    any(kill_chain['phase_name'] in changed_phases for kill_chain in technique.kill_chain_phases):
+                affected.add(technique.internal_id)
+        return affected
+
+    def get_sections(self):
+        """
+        Get the added, changed and removed objects grouped by changelog section
+        """
+
+        sections = { section: {'added': [], 'changed': [], 'removed': []} for section in dict.fromkeys(DIFF_TYPES.values()) }
+        for _, record in self.added:
+            sections[DIFF_TYPES[record['type']]]['added'].append({'id': record['attack_id'], 'name': record['name']})
+        for _, old, new in self.changed:
+            sections[DIFF_TYPES[new['type']]]['changed'].append({'id': new['attack_id'],
+                                                                 'name': new['name'],
+                                                                 'old_name': old['name'],
+                                                                 'old_version': old['version'][1],
+                                                                 'version': new['version'][1]})
+        for _, record in self.removed:
+            sections[DIFF_TYPES[record['type']]]['removed'].append({'id': record['attack_id'], 'name': record['name']})
+        for section in sections.values():
+            for objects in section.values():
+                objects.sort(key=lambda obj: (obj['id'] or '', obj['name']))
+        return [ dict(name=name, **objects) for name, objects in sections.items() if any(objects.values()) ]
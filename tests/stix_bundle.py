@@ -0,0 +1,101 @@
+import copy
+import json
+import os
+
+from src.stix_parser import StixParser
+
+TIMESTAMP = "2025-01-01T00:00:00.000Z"
+
+
+def _object(stix_type, name, attack_id, description, **properties):
+    stix_object = {
+        'type': stix_type,
+        'spec_version': '2.1',
+        'id': f"{stix_type}--{attack_id.lower().replace('.', '-')}",
+        'created': TIMESTAMP,
+        'modified': TIMESTAMP,
+        'name': name,
+        'description': description,
+        'external_references': [ {'source_name': 'mitre-attack',
+                                  'external_id': attack_id,
+                                  'url': f"https://attack.mitre.org/{attack_id.replace('.', '/')}"},
+                                 {'source_name': 'Report', 'url': 'https://example.com/report'} ],
+        'x_mitre_version': '1.0',
+    }
+    stix_object.update(properties)
+    return stix_object
+
+
+def _relationship(relationship_type, source, target):
+    return {
+        'type': 'relationship',
+        'spec_version': '2.1',
+        'id': f"relationship--{source['id'].split('--')[1]}-{relationship_type}-{target['id'].split('--')[1]}",
+        'created': TIMESTAMP,
+        'modified': TIMESTAMP,
+        'relationship_type': relationship_type,
+        'source_ref': source['id'],
+        'target_ref': target['id'],
+        'description': f"{source['name']} {relationship_type} {target['name']}.(Citation: Report)",
+        'external_references': [ {'source_name': 'Report', 'url': 'https://example.com/report'} ],
+    }
+
+
+def make_objects():
+    """
+    Get the objects of a small ATT&CK-shaped bundle, by ATT&CK ID. The relationships are keyed by their STIX id.
+    """
+
+    def phase(shortname):
+        return [ {'kill_chain_name': 'mitre-attack', 'phase_name': shortname} ]
+
+    objects = {
+        'TA0001': _object('x-mitre-tactic', "Initial Access", 'TA0001', "Getting in.", x_mitre_shortname='initial-access'),
+        'TA0002': _object('x-mitre-tactic', "Execution", 'TA0002', "Running code.", x_mitre_shortname='execution'),
+        'T1000': _object('attack-pattern', "Phishing", 'T1000', "Adversaries may send phishing messages to gain access.",
+                         kill_chain_phases=phase('initial-access'), x_mitre_is_subtechnique=False, x_mitre_platforms=['Windows']),
+        'T1000.001': _object('attack-pattern', "Spearphishing Attachment", 'T1000.001', "Adversaries may attach malicious files.",
+                             kill_chain_phases=phase('initial-access'), x_mitre_is_subtechnique=True, x_mitre_platforms=['Windows']),
+        'T1001': _object('attack-pattern', "Command Interpreter", 'T1001', "Adversaries may abuse a command interpreter to run commands.",
+                         kill_chain_phases=phase('execution'), x_mitre_is_subtechnique=False, x_mitre_platforms=['Linux']),
+        'M1000': _object('course-of-action', "User Training", 'M1000', "Teach users which command to give to an interpreter."),
+        'G1000': _object('intrusion-set', "Test Group", 'G1000', "A group targeting test networks.", aliases=["Test Group", "Tester"]),
+        'S1000': _object('malware', "Backdoor", 'S1000', "A backdoor.", is_family=True, x_mitre_aliases=["Backdoor"],
+                         x_mitre_platforms=['Linux']),
+    }
+    relationships = [
+        _relationship('subtechnique-of', objects['T1000.001'], objects['T1000']),
+        _relationship('mitigates', objects['M1000'], objects['T1000']),
+        _relationship('uses', objects['G1000'], objects['T1001']),
+        _relationship('uses', objects['S1000'], objects['T1001']),
+        _relationship('uses', objects['G1000'], objects['S1000']),
+    ]
+    objects.update((relationship['id'], relationship) for relationship in relationships)
+    return objects
+
+
+def write_bundle(path, objects):
+    with open(path, 'w') as fd:
+        json.dump({'type': 'bundle', 'id': 'bundle--test', 'objects': list(objects.values())}, fd)
+
+
+def parse_objects(work_dir, objects, name='bundle.json', snapshot_dir=None):
+    """
+    Write the objects to a bundle in work_dir and extract all the types from it
+    """
+
+    path = os.path.join(work_dir, name)
+    write_bundle(path, objects)
+    parser = StixParser(path, 'enterprise-attack', snapshot_dir=snapshot_dir)
+    parser.get_data(tactics=True, techniques=True, mitigations=True, groups=True, software=True, campaigns=True, datasources=True)
+    return parser
+
+
+def update(objects, key, **properties):
+    """
+    Get a copy of objects where an object has new properties and a new modified timestamp
+    """
+
+    objects = copy.deepcopy(objects)
+    objects[key].update(properties, modified="2025-06-01T00:00:00.000Z")
+    return objects
@@ -0,0 +1,235 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import base64
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from src.downloader import Download, DownloadError, get_session
+from src.stix_cache import StixCache
+
+BODY = json.dumps({'type': 'bundle', 'objects': [ {'id': f"x--{i}", 'name': 'x' * 100} for i in range(2000) ]}).encode()
+SHA256 = hashlib.sha256(BODY).hexdigest()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serve BODY as a bundle, answering 304 to a matching If-None-Match, and following the behaviour set by the test:
+      drops    number of responses cut after drop_at bytes of the body
+      statuses statuses answered, one per request, before serving the body
+      ranges   whether the Range requests are honoured
+      versions ETag and body of each response, the last one being kept
+    """
+
+    protocol_version = 'HTTP/1.1'
+    behaviour = None
+    requests = None
+
+    def do_GET(self):
+        behaviour = self.behaviour
+        self.requests.append(dict(self.headers))
+        if behaviour['statuses']:
+            self.send_response(behaviour['statuses'].pop(0))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        etag, body = behaviour['versions'].pop(0) if len(behaviour['versions']) > 1 else behaviour['versions'][0]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        start = 0
+        if behaviour['ranges'] and self.headers.get('Range') and self.headers.get('If-Range') == etag:
+            start = int(self.headers['Range'][len('bytes='):-1])
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.send_header('ETag', etag)
+        if behaviour.get('digest'):
+            self.send_header('Digest', behaviour['digest'])
+        self.end_headers()
+
+        if behaviour['drops']:
+            behaviour['drops'] -= 1
+            self.wfile.write(body[start:start + behaviour['drop_at']])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.wfile.write(body[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServerTest(unittest.TestCase):
+    """
+    Start the stand-in server once for the tests of a class
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/enterprise-attack-17.0.json"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInHandler.behaviour = {'drops': 0, 'drop_at': 100000, 'statuses': [], 'ranges': True, 'versions': [('"v1"', BODY)]}
+        StandInHandler.requests = []
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'bundle.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+class DownloadTest(StandInServerTest):
+
+    def download(self, **options):
+        options.setdefault('backoff', 0)
+        return Download(self.url, self.path, **options).run()
+
+    def read(self):
+        with open(self.path, 'rb') as fd:
+            return fd.read()
+
+    def test_download(self):
+        self.assertTrue(self.download())
+        self.assertEqual(self.read(), BODY)
+        self.assertEqual(len(StandInHandler.requests), 1)
+        self.assertEqual(StandInHandler.requests[0]['Accept-Encoding'], 'identity')
+        self.assertFalse(os.path.exists(f"{self.path}.part"))
+
+    def test_resume_after_dropped_connection(self):
+        StandInHandler.behaviour['drops'] = 2
+        self.assertTrue(self.download())
+        self.assertEqual(self.read(), BODY)
+        ranges = [ request.get('Range') for request in StandInHandler.requests ]
+        self.assertIsNone(ranges[0])
+        self.assertEqual(len(ranges), 3)
+        offsets = [ int(r[len('bytes='):-1]) for r in ranges[1:] ]
+        self.assertTrue(0 < offsets[0] < offsets[1] < len(BODY))
+        self.assertTrue(all(request.get('If-Range') == '"v1"' for request in StandInHandler.requests[1:]))
+
+    def test_range_ignored(self):
+        StandInHandler.behaviour['drops'] = 2
+        StandInHandler.behaviour['ranges'] = False
+        self.assertTrue(self.download())
+        self.assertEqual(self.read(), BODY)
+        self.assertEqual(len(StandInHandler.requests), 3)
+
+    def test_etag_changed_between_attempts(self):
+        new_body = BODY.replace(b'x' * 100, b'y' * 100)
+        StandInHandler.behaviour.update(drops=1, versions=[('"v1"', BODY), ('"v2"', new_body)])
+        self.assertTrue(self.download())
+        # The partial file of the first version is not completed with the second one
+        self.assertEqual(self.read(), new_body)
+        self.assertEqual(StandInHandler.requests[1].get('If-Range'), '"v1"')
+        self.assertEqual(len(StandInHandler.requests), 2)
+
+    def test_resume_in_a_later_run(self):
+        StandInHandler.behaviour['drops'] = 10
+        with self.assertRaises(DownloadError):
+            self.download(attempts=2)
+        self.assertTrue(os.path.isfile(f"{self.path}.part"))
+        StandInHandler.requests.clear()
+        StandInHandler.behaviour['drops'] = 0
+        self.assertTrue(self.download())
+        self.assertEqual(self.read(), BODY)
+        self.assertIsNotNone(StandInHandler.requests[0].get('Range'))
+
+    def test_retry_after_503(self):
+        StandInHandler.behaviour['statuses'] = [503, 503]
+        self.assertTrue(self.download())
+        self.assertEqual(self.read(), BODY)
+        self.assertEqual(len(StandInHandler.requests), 3)
+
+    def test_client_error_not_retried(self):
+        StandInHandler.behaviour['statuses'] = [404]
+        with self.assertRaises(DownloadError):
+            self.download()
+        self.assertEqual(len(StandInHandler.requests), 1)
+
+    def test_give_up(self):
+        StandInHandler.behaviour['statuses'] = [503] * 3
+        with self.assertRaises(DownloadError):
+            self.download(attempts=3)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_hash(self):
+        self.assertTrue(self.download(sha256=SHA256))
+        os.remove(self.path)
+        with self.assertRaises(DownloadError):
+            self.download(sha256='0' * 64, attempts=2)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(f"{self.path}.part"))
+
+    def test_digest_header(self):
+        StandInHandler.behaviour['digest'] = 'SHA-256=' + base64.b64encode(hashlib.sha256(b'other').digest()).decode()
+        with self.assertRaises(DownloadError):
+            self.download(attempts=1)
+        StandInHandler.behaviour['digest'] = 'SHA-256=' + base64.b64encode(bytes.fromhex(SHA256)).decode()
+        self.assertTrue(self.download())
+
+    def test_malformed_digest_header(self):
+        StandInHandler.behaviour['digest'] = 'SHA-256=not base64!'
+        self.assertTrue(self.download())
+        self.assertEqual(self.read(), BODY)
+
+    def test_conditional_request(self):
+        self.assertFalse(self.download(headers={'If-None-Match': '"v1"'}))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertTrue(self.download(headers={'If-None-Match': '"v0"'}))
+
+    def test_shared_session(self):
+        self.assertIs(get_session(), get_session())
+        self.assertIs(Download(self.url, self.path).session, get_session())
+
+
+class StixCacheTest(StandInServerTest):
+
+    def test_fetch(self):
+        cache = StixCache(os.path.join(self.tmp_dir, 'cache'))
+        StandInHandler.behaviour['drops'] = 1
+        path = cache.fetch(self.url, 'key', sha256=SHA256)
+        with gzip.open(path, 'rb') as fd:
+            self.assertEqual(fd.read(), BODY)
+        self.assertEqual(sorted(os.listdir(cache.cache_dir)), ['key.json.gz', 'key.meta.json'])
+
+    def test_fetch_corrupted_cache(self):
+        cache = StixCache(os.path.join(self.tmp_dir, 'cache'))
+        path = cache.fetch(self.url, 'key')
+        with open(path, 'r+b') as fd:
+            fd.seek(20)
+            fd.write(b'corrupted')
+        StandInHandler.requests.clear()
+        cache.fetch(self.url, 'key', pinned=True)
+        self.assertEqual(len(StandInHandler.requests), 1)
+        with gzip.open(path, 'rb') as fd:
+            self.assertEqual(fd.read(), BODY)
+
+    def test_fetch_unexpected_hash(self):
+        cache = StixCache(os.path.join(self.tmp_dir, 'cache'))
+        cache.fetch(self.url, 'key')
+        StandInHandler.requests.clear()
+        with self.assertRaises(SystemExit):
+            cache.fetch(self.url, 'key', pinned=True, offline=True, sha256='0' * 64)
+        self.assertEqual(StandInHandler.requests, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+import requests
+
+from src.lookup_server import LookupTable, create_server
+from tests.stix_bundle import make_objects, parse_objects
+
+
+class LookupServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work_dir = tempfile.mkdtemp()
+        parser = parse_objects(cls.work_dir, make_objects())
+        cls.table = LookupTable(parser)
+        cls.server = create_server(cls.table, port=0)
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.work_dir)
+
+    def test_record(self):
+        record = json.loads(self.table.lookup('t1001'))
+        self.assertEqual(record['name'], "Command Interpreter")
+        self.assertEqual(record['url'], "https://attack.mitre.org/T1001")
+        self.assertEqual(record['tactics'], [ {'id': 'TA0002', 'name': "Execution"} ])
+        self.assertEqual(record['groups'], [ {'id': 'G1000', 'name': "Test Group"} ])
+        self.assertEqual(record['software'], [ {'id': 'S1000', 'name': "Backdoor"} ])
+        tactic = json.loads(self.table.lookup('TA0001'))
+        self.assertEqual([ technique['id'] for technique in tactic['techniques'] ], ['T1000', 'T1000.001'])
+
+    def test_lookup(self):
+        response = requests.get(f"{self.url}/lookup/G1000")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['software'], [ {'id': 'S1000', 'name': "Backdoor"} ])
+        # Served from the cache
+        self.assertEqual(requests.get(f"{self.url}/lookup/g1000").json(), response.json())
+        self.assertEqual(requests.get(f"{self.url}/lookup/T9999").status_code, 404)
+
+    def test_batch(self):
+        response = requests.get(f"{self.url}/lookup", params={'ids': 'T1000,M1000,T9999'})
+        results = response.json()['results']
+        self.assertEqual(list(results), ['T1000', 'M1000', 'T9999'])
+        self.assertEqual(results['M1000']['techniques'], [ {'id': 'T1000', 'name': "Phishing"} ])
+        self.assertIsNone(results['T9999'])
+
+        response = requests.post(f"{self.url}/lookup", json={'ids': ['S1000', 'S1000']})
+        self.assertEqual(list(response.json()['results']), ['S1000'])
+        self.assertEqual(requests.post(f"{self.url}/lookup", json={'ids': 'S1000'}).status_code, 400)
+        self.assertEqual(requests.post(f"{self.url}/lookup", data=b'not json').status_code, 400)
+
+    def test_stats(self):
+        requests.get(f"{self.url}/lookup/T1000")
+        requests.get(f"{self.url}/unknown")
+        stats = requests.get(f"{self.url}/stats").json()
+        self.assertEqual(stats['objects'], 8)
+        self.assertGreaterEqual(stats['counters']['requests'], 2)
+        self.assertGreaterEqual(stats['counters']['errors'], 1)
+        self.assertIn('lookup', stats['timings'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.markdown_generator import MarkdownGenerator, MANIFEST_FILE
+from tests.stix_bundle import make_objects, parse_objects, update
+
+NOTE_TYPES = ('tactic', 'technique', 'mitigation', 'group', 'software', 'campaign', 'datasource')
+
+
+class ManifestTest(unittest.TestCase):
+    """
+    Incremental writes of the notes, for both note writers
+    """
+
+    staged = False
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        self.output_dir = os.path.join(self.work_dir, 'vault')
+        os.mkdir(self.output_dir)
+        self.objects = make_objects()
+
+    def generate(self, objects):
+        parser = parse_objects(self.work_dir, objects)
+        markdown_generator = MarkdownGenerator(self.output_dir, parser.tactics, parser.techniques, parser.mitigations, parser.groups,
+                                               parser.software, parser.campaigns, parser.datasources, staged=self.staged)
+        for note_type in NOTE_TYPES:
+            getattr(markdown_generator, f"create_{note_type}_notes")()
+        markdown_generator.finalize()
+        return markdown_generator
+
+    def get_mtimes(self):
+        return { os.path.join(dirpath, filename): os.stat(os.path.join(dirpath, filename)).st_mtime_ns
+                 for dirpath, _, filenames in os.walk(self.output_dir) for filename in filenames }
+
+    def test_first_run(self):
+        markdown_generator = self.generate(self.objects)
+        self.assertEqual(len(markdown_generator.added), 8)
+        self.assertEqual((markdown_generator.changed, markdown_generator.removed), ([], []))
+        with open(os.path.join(self.output_dir, MANIFEST_FILE), 'r') as fd:
+            self.assertEqual(sorted(json.load(fd)), sorted(markdown_generator.added))
+        self.assertTrue(os.path.isfile(os.path.join(self.output_dir, 'techniques', "Command Interpreter.md")))
+
+    def test_unchanged(self):
+        self.generate(self.objects)
+        mtimes = self.get_mtimes()
+        markdown_generator = self.generate(self.objects)
+        self.assertEqual((markdown_generator.added, markdown_generator.changed, markdown_generator.removed), ([], [], []))
+        mtimes.pop(os.path.join(self.output_dir, MANIFEST_FILE))
+        self.assertEqual({ path: mtime for path, mtime in self.get_mtimes().items() if path in mtimes }, mtimes)
+
+    def test_changed_and_removed(self):
+        self.generate(self.objects)
+        with open(os.path.join(self.output_dir, 'groups', 'notes.md'), 'w') as fd:
+            fd.write("Not generated")
+        objects = update(self.objects, 'T1001', description="A new description.")
+        del objects['T1000.001']
+        objects = { key: stix_object for key, stix_object in objects.items()
+                    if stix_object.get('source_ref') != self.objects['T1000.001']['id'] }
+        markdown_generator = self.generate(objects)
+
+        self.assertEqual(markdown_generator.added, [])
+        # Phishing loses its subtechnique
+        self.assertEqual(sorted(markdown_generator.changed), [ os.path.join('techniques', "Command Interpreter.md"),
+                                                               os.path.join('techniques', "Phishing.md") ])
+        self.assertEqual(markdown_generator.removed, [ os.path.join('techniques', "Spearphishing Attachment.md") ])
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'techniques', "Spearphishing Attachment.md")))
+        with open(os.path.join(self.output_dir, 'techniques', "Command Interpreter.md"), 'r') as fd:
+            self.assertIn("A new description.", fd.read())
+        # The files not created by the generator are kept
+        self.assertTrue(os.path.isfile(os.path.join(self.output_dir, 'groups', 'notes.md')))
+
+
+class StagedManifestTest(ManifestTest):
+
+    staged = True
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.markdown_reader import MarkdownReader
+from src.models import MITREGroup, MITRETechnique
+from src.note_watcher import NoteLinker, NoteWatcher
+
+
+def make_linker():
+    technique = MITRETechnique("Command Interpreter")
+    technique.id = 'T1001'
+    subtechnique = MITRETechnique("Spearphishing Attachment")
+    subtechnique.id = 'T1000.001'
+    group = MITREGroup("Test Group")
+    group.id = 'G1000'
+    return NoteLinker([technique, subtechnique, group])
+
+
+class NoteLinkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.linker = make_linker()
+
+    def test_link(self):
+        self.assertEqual(self.linker.link("G1000 used T1001 and T1000.001 (T1000 is unknown)."),
+                         "[[Test Group\\|G1000]] used [[Command Interpreter\\|T1001]] and "
+                         "[[Spearphishing Attachment\\|T1000.001]] (T1000 is unknown).")
+
+    def test_skipped(self):
+        content = ("---\ntags: T1001\n---\n"
+                   "Already [[Command Interpreter\\|T1001]], https://attack.mitre.org/techniques/T1001 and `T1001`.\n"
+                   "```\nT1001\n```\n")
+        self.assertEqual(self.linker.link(content), content)
+
+    def test_idempotent(self):
+        linked = self.linker.link("T1001, G1000.")
+        self.assertEqual(self.linker.link(linked), linked)
+
+    def test_markdown_reader(self):
+        # --generate-hyperlinks links a note the same way as --watch
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir)
+        note_file = os.path.join(work_dir, 'report.md')
+        content = "---\nalias: T1001\n---\nG1000 used T1001.\n"
+        with open(note_file, 'w') as fd:
+            fd.write(content)
+        MarkdownReader(note_file).create_hyperlinks(self.linker)
+        with open(note_file, 'r') as fd:
+            self.assertEqual(fd.read(), self.linker.link(content))
+
+
+class NoteWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.watch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.watch_dir)
+        self.note_file = os.path.join(self.watch_dir, 'report.md')
+        self.watcher = NoteWatcher(self.watch_dir, make_linker(), debounce=0.5)
+        self.watcher._seen = self.watcher._scan()
+
+    def write(self, content):
+        with open(self.note_file, 'w') as fd:
+            fd.write(content)
+
+    def read(self):
+        with open(self.note_file, 'r') as fd:
+            return fd.read()
+
+    def test_debounce(self):
+        self.write("Used T1001")
+        self.watcher.poll(now=0)
+        self.watcher.poll(now=0.4)
+        self.assertEqual(self.read(), "Used T1001")
+        # Edited again: the delay starts over
+        self.write("Used T1001.")
+        self.watcher.poll(now=0.6)
+        self.watcher.poll(now=1.0)
+        self.assertEqual(self.read(), "Used T1001.")
+        self.watcher.poll(now=1.1)
+        self.assertEqual(self.read(), "Used [[Command Interpreter\\|T1001]].")
+        self.assertEqual((self.watcher.linked, self.watcher.rewritten), (1, 1))
+
+    def test_own_writes(self):
+        self.write("Used T1001")
+        self.watcher.poll(now=0)
+        self.watcher.poll(now=1)
+        self.assertEqual(self.watcher.rewritten, 1)
+        # The watcher does not react to the note it has rewritten
+        self.watcher.poll(now=2)
+        self.watcher.poll(now=3)
+        self.assertEqual(self.watcher.linked, 1)
+
+        # A note without new links is not rewritten
+        self.write(self.read() + "\nNothing to link.")
+        self.watcher.poll(now=4)
+        self.watcher.poll(now=5)
+        self.assertEqual((self.watcher.linked, self.watcher.rewritten), (2, 1))
+
+    def test_ignored_files(self):
+        os.mkdir(os.path.join(self.watch_dir, '.obsidian'))
+        for file_name in (os.path.join('.obsidian', 'notes.md'), 'notes.txt', '.hidden.md'):
+            with open(os.path.join(self.watch_dir, file_name), 'w') as fd:
+                fd.write("T1001")
+        self.watcher.poll(now=0)
+        self.watcher.poll(now=1)
+        self.assertEqual(self.watcher.linked, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
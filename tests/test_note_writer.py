@@ -0,0 +1,111 @@
+from unittest import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from src import note_writer
+from src.note_writer import StagedNoteWriter, STAGING_DIR, OLD_SUFFIX
+
+
+class StagedNoteWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def path(self, *names):
+        return os.path.join(self.output_dir, *names)
+
+    def read(self, *names):
+        with open(self.path(*names), 'r') as fd:
+            return fd.read()
+
+    def write_vault(self):
+        """
+        Write a first version of the vault, with a file added by the user to a note folder
+        """
+
+        writer = StagedNoteWriter(self.output_dir)
+        writer.write(os.path.join('techniques', 'T1.md'), 'one')
+        writer.write(os.path.join('techniques', 'T2.md'), 'two')
+        writer.write(os.path.join('groups', 'G1.md'), 'group')
+        writer.write('index.md', 'index')
+        writer.close()
+        with open(self.path('techniques', 'mine.md'), 'w') as fd:
+            fd.write('mine')
+
+    def update_vault(self):
+        writer = StagedNoteWriter(self.output_dir)
+        writer.write(os.path.join('techniques', 'T1.md'), 'one, updated')
+        writer.remove(os.path.join('techniques', 'T2.md'))
+        writer.keep(os.path.join('groups', 'G1.md'))
+        writer.write('index.md', 'index, updated')
+        writer.close()
+
+    def check_vault(self):
+        for note_dir in ('techniques', 'groups'):
+            self.assertTrue(os.path.isdir(self.path(note_dir)))
+            self.assertFalse(os.path.islink(self.path(note_dir)))
+        self.assertEqual(self.read('techniques', 'T1.md'), 'one, updated')
+        self.assertFalse(os.path.exists(self.path('techniques', 'T2.md')))
+        self.assertEqual(self.read('techniques', 'mine.md'), 'mine')
+        self.assertEqual(self.read('groups', 'G1.md'), 'group')
+        self.assertEqual(self.read('index.md'), 'index, updated')
+        self.assertFalse(os.path.exists(self.path(STAGING_DIR)))
+
+    def test_swap(self):
+        self.write_vault()
+        self.update_vault()
+        self.check_vault()
+
+    def test_swap_with_renames(self):
+        self.write_vault()
+        with mock.patch.object(note_writer, '_exchange', return_value=False) as exchange:
+            self.update_vault()
+        self.assertEqual(exchange.call_count, 2)
+        self.check_vault()
+
+    def test_copy_without_hard_links(self):
+        self.write_vault()
+        with mock.patch.object(os, 'link', side_effect=OSError("Hard links are not supported")):
+            self.update_vault()
+        self.check_vault()
+
+    def test_roll_back_interrupted_swap(self):
+        self.write_vault()
+        # A crash between the two renames leaves the folder in the staging directory only
+        os.makedirs(self.path(STAGING_DIR, 'techniques'))
+        os.rename(self.path('techniques'), self.path(STAGING_DIR, f"techniques{OLD_SUFFIX}"))
+
+        self.update_vault()
+        self.check_vault()
+
+    def test_completed_swap(self):
+        self.write_vault()
+        # A crash after the two renames leaves the previous folder behind
+        shutil.copytree(self.path('techniques'), self.path(STAGING_DIR, f"techniques{OLD_SUFFIX}"))
+
+        self.update_vault()
+        self.check_vault()
+
+    def test_failed_write(self):
+        self.write_vault()
+        writer = StagedNoteWriter(self.output_dir)
+        writer.write(os.path.join('techniques', 'T1.md'), 'one, updated')
+        writer.keep(os.path.join('techniques', 'missing.md'))
+        with self.assertRaises(OSError):
+            writer.close()
+        self.assertEqual(self.read('techniques', 'T1.md'), 'one')
+        self.assertFalse(os.path.exists(self.path(STAGING_DIR)))
+
+
+class ExchangeTest(unittest.TestCase):
+
+    def test_unavailable(self):
+        with mock.patch.object(note_writer.sys, 'platform', 'win32'):
+            self.assertFalse(note_writer._exchange('a', 'b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
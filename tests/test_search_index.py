@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.search_index import SearchIndex, parse_query
+from tests.stix_bundle import make_objects, parse_objects
+
+
+class SearchIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work_dir = tempfile.mkdtemp()
+        cls.index = SearchIndex.build(parse_objects(cls.work_dir, make_objects()))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.work_dir)
+
+    def search(self, query, **filters):
+        return [ document['id'] for _, document, _ in self.index.search(query, **filters) ]
+
+    def test_parse_query(self):
+        self.assertEqual(parse_query('"Command Interpreter" phishing T1000.001'),
+                         [['command', 'interpreter'], ['phishing'], ['t1000.001']])
+
+    def test_terms(self):
+        # The terms can be anywhere in the fields of a document
+        self.assertEqual(set(self.search('command interpreter')), {'T1001', 'M1000', 'G1000', 'S1000'})
+
+    def test_phrase(self):
+        # M1000 has both terms, but not next to each other
+        results = self.search('"command interpreter"')
+        self.assertEqual(set(results), {'T1001', 'G1000', 'S1000'})
+        # The name matches weigh more than the relationships
+        self.assertEqual(results[0], 'T1001')
+
+    def test_phrase_and_terms(self):
+        # Every clause must match: only G1000 has the alias Tester
+        self.assertEqual(self.search('"command interpreter" tester'), ['G1000'])
+        self.assertEqual(self.search('"interpreter command"'), [])
+
+    def test_filters(self):
+        self.assertEqual(self.search('command interpreter', types=['Group']), ['G1000'])
+        self.assertEqual(set(self.search('adversaries', platforms=['windows'])), {'T1000', 'T1000.001'})
+        self.assertEqual(self.search('adversaries', tactics=['execution']), ['T1001'])
+
+    def test_save_and_load(self):
+        path = os.path.join(self.work_dir, 'index', 'search.json')
+        self.index.save(path)
+        index = SearchIndex.load(path)
+        self.assertEqual(index.search('"command interpreter"'), self.index.search('"command interpreter"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
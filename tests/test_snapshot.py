@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.snapshot import SNAPSHOT_LISTS
+from src.stix_parser import StixParser
+from tests.stix_bundle import make_objects, parse_objects, update, write_bundle
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        self.snapshot_dir = os.path.join(self.work_dir, 'snapshots')
+        self.objects = make_objects()
+        self.parser = parse_objects(self.work_dir, self.objects, snapshot_dir=self.snapshot_dir)
+
+    def load(self):
+        parser = StixParser(os.path.join(self.work_dir, 'bundle.json'), 'enterprise-attack', snapshot_dir=self.snapshot_dir)
+        parser.get_data(tactics=True, techniques=True, mitigations=True, groups=True, software=True, campaigns=True, datasources=True)
+        return parser
+
+    def test_round_trip(self):
+        self.assertTrue(os.path.isfile(self.parser.snapshot_path))
+        parser = self.load()
+        # The STIX data is not loaded
+        self.assertIsNone(parser.src)
+
+        for list_name in SNAPSHOT_LISTS:
+            self.assertEqual([ (obj.internal_id, obj.id, obj.name, obj.description, list(obj.references))
+                               for obj in getattr(parser, list_name) ],
+                             [ (obj.internal_id, obj.id, obj.name, obj.description, list(obj.references))
+                               for obj in getattr(self.parser, list_name) ])
+
+        technique = parser.objects[self.objects['T1001']['id']]
+        self.assertEqual([ tactic.name for tactic in technique.tactics ], ["Execution"])
+        # The links point to the loaded objects, not to copies of them
+        group = parser.groups[0]
+        self.assertIs(group.techniques_used[0]['technique'], technique)
+        self.assertIs(group.software_used[0]['software'], parser.software[0])
+        self.assertIs(technique.tactics[0], parser.tactics[1])
+        self.assertEqual(group.techniques_used[0].description, self.parser.groups[0].techniques_used[0].description)
+
+    def test_changed_bundle(self):
+        write_bundle(os.path.join(self.work_dir, 'bundle.json'), update(self.objects, 'T1001', name="Shell"))
+        parser = self.load()
+        self.assertIsNotNone(parser.src)
+        self.assertEqual(parser.objects[self.objects['T1001']['id']].name, "Shell")
+        self.assertEqual(len(os.listdir(self.snapshot_dir)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import shutil
+import tempfile
+import unittest
+
+from src.version_diff import VersionDiff
+from tests.stix_bundle import make_objects, parse_objects, update
+
+
+class VersionDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        self.objects = make_objects()
+        self.old_parser = parse_objects(self.work_dir, self.objects, 'old.json')
+
+    def diff(self, new_objects):
+        new_parser = parse_objects(self.work_dir, new_objects, 'new.json')
+        diff = VersionDiff(self.old_parser, new_parser)
+        return diff, diff.get_affected(new_parser.techniques)
+
+    def ids(self, *keys):
+        return { self.objects[key]['id'] for key in keys }
+
+    def test_unchanged(self):
+        diff, affected = self.diff(self.objects)
+        self.assertEqual(affected, set())
+        self.assertEqual((diff.added, diff.changed, diff.removed), ([], [], []))
+
+    def test_changed_description(self):
+        diff, affected = self.diff(update(self.objects, 'T1001', description="A new description."))
+        self.assertEqual(affected, self.ids('T1001'))
+        self.assertEqual([ internal_id for internal_id, _, _ in diff.changed ], [self.objects['T1001']['id']])
+
+    def test_renamed_group(self):
+        diff, affected = self.diff(update(self.objects, 'G1000', name="Renamed Group"))
+        # The notes of the neighbours show the name of the group
+        self.assertEqual(affected, self.ids('G1000', 'T1001', 'S1000'))
+        self.assertEqual(diff.get_sections(), [ {'name': 'Groups', 'added': [], 'removed': [],
+                                                  'changed': [ {'id': 'G1000', 'name': "Renamed Group", 'old_name': "Test Group",
+                                                                'old_version': '1.0', 'version': '1.0'} ]} ])
+
+    def test_renamed_tactic(self):
+        diff, affected = self.diff(update(self.objects, 'TA0002', name="Run"))
+        # The techniques of the tactic show its name
+        self.assertEqual(affected, self.ids('TA0002', 'T1001'))
+
+    def test_renamed_subtechnique(self):
+        diff, affected = self.diff(update(self.objects, 'T1000.001', name="Malicious Attachment"))
+        self.assertEqual(affected, self.ids('T1000.001', 'T1000'))
+
+    def test_changed_mitigation_relationship(self):
+        relationship_id = next(key for key, stix_object in self.objects.items()
+                               if stix_object.get('relationship_type') == 'mitigates')
+        diff, affected = self.diff(update(self.objects, relationship_id, description="Updated."))
+        # Every technique note lists the references of the mitigation relationships
+        self.assertEqual(affected, self.ids('M1000', 'T1000', 'T1000.001', 'T1001'))
+
+    def test_deprecated_software(self):
+        diff, affected = self.diff(update(self.objects, 'S1000', x_mitre_deprecated=True))
+        self.assertEqual([ internal_id for internal_id, _ in diff.removed ], [self.objects['S1000']['id']])
+        self.assertEqual(affected, self.ids('S1000', 'T1001', 'G1000'))
+
+
+if __name__ == '__main__':
+    unittest.main()